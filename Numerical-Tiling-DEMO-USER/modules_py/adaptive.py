@@ -0,0 +1,127 @@
+# modules_py/adaptive.py
+import os
+import numpy as np
+from modules_py.architecture import MODE_FOLDERS, read_affected_modes
+from modules_py.load_data import LazyData
+from modules_py.output_format import read_archive
+from modules_py.run_fortran import run_simulation
+
+"""
+Adaptive sampling of the injected modes of a case.
+
+fortran_N_mod and fortran_N_step define the lattice of injection points
+N_ref = N_initial_inj + N_step * iter, and a uniform run integrates every one
+of them. `adaptive_simulation` starts from a coarse subset of the lattice and
+only adds modes where zeta, relative to the case-0 baseline, is not yet
+resolved: where linear interpolation between the integrated modes would be
+off by more than a tolerance (curvature or sharp features), and around the
+first and last modes reached by the accidents of the case.
+
+The modes are integrated by the worker binaries (`run_simulation(...,
+runner="workers", modes=...)`), so every round only integrates the new modes;
+the combined power spectrum and the case archive hold the rows of the
+integrated modes with their iters, and `load_structure` reads them as usual
+(`structure["iters"]`).
+"""
+
+
+def case_spectrum(mode, mod_pref):
+    """Iters and zeta of the combined power spectrum of a case, from its archive (None if missing)."""
+    mod_tag = f"{mod_pref:03d}"
+    archive = os.path.join(MODE_FOLDERS[mode], f"Data_&_Codes_{mod_tag}", f"Evolution_{mod_tag}", f"Case_{mod_tag}.npz")
+    if not os.path.exists(archive):
+        return None
+    data = read_archive(archive)
+    return np.asarray(data["power_iters"]), np.asarray(LazyData(data["power_spectrum"], mode)["zeta"])
+
+
+def refinement_points(iters, x, f, tol, boundaries=()):
+    """
+    Modes to add to the integrated ones `iters` (sorted), with abscissae `x`
+    (N_ref) and values `f`: the middle mode of every gap where linear
+    interpolation of f is not accurate to `tol`.
+
+    The error of a gap is |f''| (Δx)² / 8, with f'' from the second divided
+    differences of the triples of integrated modes that contain it. Gaps are
+    always split when there are fewer than three modes, or when they contain
+    one of `boundaries` (iters where a feature starts or ends) that is not
+    resolved yet.
+    """
+    iters = np.asarray(iters)
+    x, f = np.asarray(x, dtype=np.float64), np.asarray(f, dtype=np.float64)
+    open_gap = np.diff(iters) > 1
+
+    if len(iters) < 3:
+        split = open_gap
+    else:
+        slope = np.diff(f) / np.diff(x)
+        curvature = np.abs(np.diff(slope) / (x[2:] - x[:-2]))
+        # Gap j lies in the triples centred at j and j+1
+        gap_curvature = np.zeros(len(iters) - 1)
+        gap_curvature[1:] = curvature
+        gap_curvature[:-1] = np.maximum(gap_curvature[:-1], curvature)
+        split = open_gap & (gap_curvature * np.diff(x) ** 2 / 4.0 > tol)
+
+    # A boundary b lies in the gap iters[j] < b <= iters[j+1], resolved once it is closed (b-1, b)
+    for b in boundaries:
+        j = np.searchsorted(iters, b) - 1
+        if 0 <= j < len(iters) - 1:
+            split[j] |= open_gap[j]
+
+    gaps = np.flatnonzero(split)
+    return sorted(set(((iters[gaps] + iters[gaps + 1]) // 2).tolist()))
+
+
+def adaptive_simulation(mode, param_sets, tol=1.0e-2, coarse_step=8, max_rounds=20, workers=None, compiler=None):
+    """
+    Integrate the modes of the case of `param_sets` adaptively, with the worker
+    binary of the case (the parallel entry `partition.worker_parallel`):
+
+      1. every `coarse_step`-th mode of the lattice 1..fortran_N_mod (and the last one),
+      2. f = log(zeta / zeta_case0) at the integrated modes (log(zeta) for
+         case 0), with the case-0 baseline interpolated in N_ref if it is also
+         non-uniform,
+      3. the middle modes of the gaps where f is not resolved to `tol`
+         (`refinement_points`; for cases > 0 the first and last modes
+         affected by the accidents are bracketed),
+
+    repeating 2-3 until no mode is added or after `max_rounds` rounds. The
+    case-0 outputs must exist for cases > 0. Returns the path of the combined
+    power spectrum (one row per integrated mode, in the order of iter).
+    """
+    params = param_sets[0]
+    mod_pref = params["fortran_mod_pref"]
+    N_mod = params["fortran_N_mod"]
+    N_ref = params["fortran_N_initial_inj"] + params["fortran_N_step"] * np.arange(1, N_mod + 1)
+
+    baseline, boundaries = None, []
+    if mod_pref != 0:
+        baseline = case_spectrum(mode, 0)
+        if baseline is None:
+            raise FileNotFoundError(f"Case-0 outputs not found for mode '{mode}' (run case 0 first).")
+        # Iters where the affected status changes (the mode before is not affected, or vice versa)
+        affected = np.zeros(N_mod, dtype=bool)
+        affected[np.asarray(read_affected_modes(mode, mod_pref), dtype=int) - 1] = True
+        boundaries = (np.flatnonzero(np.diff(affected)) + 2).tolist()
+
+    sampled = sorted(set(range(1, N_mod + 1, coarse_step)) | {N_mod})
+    for round_index in range(max_rounds):
+        power_file = run_simulation(
+            mode, param_sets, runner="workers", workers=workers, compiler=compiler,
+            resume=round_index > 0, modes=sampled,
+        )
+        iters, zeta = case_spectrum(mode, mod_pref)
+        f = np.log(zeta)
+        if baseline is not None:
+            f = f - np.interp(N_ref[iters - 1], N_ref[baseline[0] - 1], np.log(baseline[1]))
+
+        new = refinement_points(iters, N_ref[iters - 1], f, tol, boundaries)
+        print(f"🔎 Round {round_index + 1}: {len(iters)} modes integrated, {len(new)} added")
+        if not new:
+            break
+        sampled = sorted(set(sampled) | set(new))
+    else:
+        print(f"⚠️  max_rounds = {max_rounds} reached before the tolerance")
+
+    print(f"✅ Adaptive spectrum of case {mod_pref:03d}: {len(sampled)} of {N_mod} modes")
+    return power_file
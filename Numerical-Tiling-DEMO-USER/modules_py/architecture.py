@@ -1,6 +1,8 @@
 # modules_py/architecture.py
 
 import os
+import hashlib
+import numpy as np
 
 """
 Module responsible for managing the folder structure associated with the different
@@ -49,7 +51,181 @@ def create_split_file(mode="single"):
 
     # Write the file content
     with open(include_path, "w") as f:
-        f.write("int0 = 0.0\n")
+        f.write("! No modes affected\n")
+
+    # Case 0 has no affected modes
+    write_affected_modes(full_path, 0, [])
 
     print(f"✔ Created: {include_path}")
     return include_path
+
+
+# ============================================================
+# Affected modes of a case
+# Fortran membership test + plain list for the Python side
+# ============================================================
+
+def write_affected_modes(folder, mod_pref, modes_with_accidents):
+    """
+    Write the list of injected modes affected by at least one accident.
+
+    folder / intX_affected.inc        (included by `mode_affected` in the templates)
+    folder / intX_affected_modes.dat  (read back by `read_affected_modes`)
+    """
+    modes = sorted(set(modes_with_accidents))
+
+    # Group consecutive modes into ranges: case (a:b)
+    ranges = []
+    for m in modes:
+        if ranges and m == ranges[-1][1] + 1:
+            ranges[-1][1] = m
+        else:
+            ranges.append([m, m])
+
+    lines = [f"! --- AUTOGENERATED: modes affected in int{mod_pref} ---"]
+    if ranges:
+        lines.append("select case (iter_inj)")
+        for first, last in ranges:
+            label = f"{first}" if first == last else f"{first}:{last}"
+            lines.append(f"    case ({label})")
+            lines.append("        mode_affected = .true.")
+        lines.append("end select")
+    else:
+        lines.append("! No modes affected")
+
+    with open(os.path.join(folder, f"int{mod_pref}_affected.inc"), "w") as f:
+        f.write("\n".join(lines) + "\n")
+
+    with open(os.path.join(folder, f"int{mod_pref}_affected_modes.dat"), "w") as f:
+        f.write("".join(f"{m}\n" for m in modes))
+
+
+def read_affected_modes(mode, mod_pref):
+    """
+    Return the sorted list of injected modes (iter indices) affected by
+    at least one accident in case `mod_pref`, as written by `make_split_incs`.
+    """
+    if mode not in MODE_FOLDERS:
+        raise ValueError(f"Unknown mode '{mode}'.")
+
+    path = os.path.join(
+        MODE_FOLDERS[mode], f"int{mod_pref}_block_file", f"int{mod_pref}_affected_modes.dat"
+    )
+    if not os.path.exists(path):
+        raise FileNotFoundError(
+            f"Affected-mode list not found: {path} (run make_split_incs first)."
+        )
+
+    with open(path) as f:
+        return [int(line) for line in f if line.strip()]
+
+
+# ============================================================
+# Block manifest of a case
+# Hash of the accident block of every mode (incremental re-simulation)
+# ============================================================
+
+def write_block_manifest(folder, mod_pref, blocks):
+    """
+    Write the hash of the accident block of every injected mode and return the
+    modes whose block changed since the previous manifest (all of them if
+    there was none).
+
+    folder / intX_block_manifest.dat   (one line per mode: iter, sha1 of its block)
+
+    `blocks[i]` is the content of intX_block_{i+1:03d}.inc.
+    """
+    path = os.path.join(folder, f"int{mod_pref}_block_manifest.dat")
+    previous = read_block_manifest(path) or {}
+    current = {i + 1: block_hash(block) for i, block in enumerate(blocks)}
+
+    with open(path, "w") as f:
+        f.write("".join(f"{i} {h}\n" for i, h in current.items()))
+
+    return changed_modes(previous, current)
+
+
+def block_hash(block):
+    """Hash of the content of one accident block."""
+    return hashlib.sha1(block.encode()).hexdigest()
+
+
+def read_block_manifest(path):
+    """Manifest {iter: hash} written by `write_block_manifest`, or None if missing."""
+    if not os.path.exists(path):
+        return None
+
+    with open(path) as f:
+        return {int(i): h for i, h in (line.split() for line in f if line.strip())}
+
+
+def changed_modes(previous, current):
+    """Sorted modes of `current` whose block is absent from or different in `previous`."""
+    return sorted(i for i, h in current.items() if previous.get(i) != h)
+
+
+# ============================================================
+# Runtime accident table of a case
+# Read at startup by the templates with fortran_accident_table = .true.
+# ============================================================
+
+def write_accident_table(folder, mod_pref, mod_accident, accidents_per_mode):
+    """
+    Write the accidents of every injected mode as a binary stream:
+
+    folder / intX_accidents.bin
+        int32   mod_pref, mod_accident, N_mod, n_acc
+        int32   starts(N_mod + 1)      (1-based: accidents of mode i are
+                                        starts[i-1] ... starts[i]-1)
+        float64 table(6, n_acc)        (kgamma, p, N_star, ds, loglE, dloglE)
+
+    `accidents_per_mode[i]` is the list of accident tuples affecting mode i+1.
+    """
+    counts = [len(acc) for acc in accidents_per_mode]
+    starts = np.concatenate([[1], 1 + np.cumsum(counts, dtype=np.int64)]).astype(np.int32)
+    table = np.array(
+        [acc for mode_acc in accidents_per_mode for acc in mode_acc], dtype=np.float64
+    ).reshape(-1, 6)
+
+    header = np.array([mod_pref, mod_accident, len(accidents_per_mode), len(table)], dtype=np.int32)
+
+    path = os.path.join(folder, f"int{mod_pref}_accidents.bin")
+    with open(path, "wb") as f:
+        header.tofile(f)
+        starts.tofile(f)
+        table.tofile(f)
+
+    return path
+
+
+def read_accident_table(mode, mod_pref):
+    """
+    Read back `intX_accidents.bin` (see `write_accident_table`).
+
+    Returns a dictionary with mod_pref, mod_accident, `starts` (1-based, length
+    N_mod + 1), `counts` (accidents per mode) and `table` (n_acc × 6).
+    """
+    if mode not in MODE_FOLDERS:
+        raise ValueError(f"Unknown mode '{mode}'.")
+
+    path = os.path.join(
+        MODE_FOLDERS[mode], f"int{mod_pref}_block_file", f"int{mod_pref}_accidents.bin"
+    )
+    if not os.path.exists(path):
+        raise FileNotFoundError(
+            f"Accident table not found: {path} (run make_split_incs first)."
+        )
+
+    with open(path, "rb") as f:
+        header = np.fromfile(f, dtype=np.int32, count=4)
+        N_mod, n_acc = int(header[2]), int(header[3])
+        starts = np.fromfile(f, dtype=np.int32, count=N_mod + 1)
+        table = np.fromfile(f, dtype=np.float64, count=6 * n_acc).reshape(n_acc, 6)
+
+    return {
+        "mod_pref": int(header[0]),
+        "mod_accident": int(header[1]),
+        "starts": starts,
+        "counts": np.diff(starts),
+        "table": table,
+    }
@@ -1,12 +1,42 @@
 # modules_py/make_split_incs.py
 import os
-from modules_py.architecture import MODE_FOLDERS
+from concurrent.futures import ProcessPoolExecutor
+from modules_py.architecture import (
+    MODE_FOLDERS, block_hash, read_block_manifest, write_affected_modes, write_accident_table, write_block_manifest
+)
 from modules_py.generate_fortran import DEFAULT_PROFILES
 from modules_py.load_data import get_ylabel_dict
+from modules_py.styles_format import draft_style, mathtext_label
 import numpy as np
 import matplotlib.pyplot as plt
-import matplotlib.patches as patches
 import matplotlib.colors as mcolors
+from matplotlib.collections import PolyCollection
+
+
+# ============================================================
+# Accident tables
+# One accident per row: add_accident(kgamma, p, N_star, delta_star, loglE, delta_loglE)
+# ============================================================
+
+ACCIDENT_DTYPE = np.dtype([
+    ("kgamma", "f8"),
+    ("p", "f8"),
+    ("N_star", "f8"),
+    ("delta_star", "f8"),
+    ("loglE", "f8"),
+    ("delta_loglE", "f8"),
+])
+
+
+def accident_table(accidents):
+    """
+    Accidents as an ACCIDENT_DTYPE array: returned as is if they already are
+    one (`generate_rectangular_grid`), otherwise built from a list of
+    6-tuples (manual configurations).
+    """
+    if isinstance(accidents, np.ndarray) and accidents.dtype == ACCIDENT_DTYPE:
+        return accidents
+    return np.array([tuple(acc) for acc in accidents], dtype=ACCIDENT_DTYPE)
 
 
 
@@ -19,6 +49,11 @@ def make_split_incs(configurations, mode, param_sets, reference_line_y):
     For each mod_pref:
         intX_block_YYY.inc
         intX_summary.inc
+        intX_affected.inc / intX_affected_modes.dat
+        intX_accidents.bin (runtime table, fortran_accident_table = .true.)
+        intX_block_manifest.dat (hash of each block; the modes whose block
+            changed since the previous call are reported, and
+            run_simulation(..., changed_only=True) re-integrates only them)
     """
 
     if mode not in MODE_FOLDERS:
@@ -40,6 +75,7 @@ def make_split_incs(configurations, mode, param_sets, reference_line_y):
         fortran_N_initial_inj + fortran_N_step * i
         for i in range(1, fortran_N_mod + 1)
     ]
+    injected = np.array(injected_modes, dtype=float)
 
     total_files = 0
     total_modes_with_accidents = 0
@@ -63,95 +99,64 @@ def make_split_incs(configurations, mode, param_sets, reference_line_y):
         os.makedirs(pref_folder, exist_ok=True)
 
         modes_with_accidents = []
+        accidents_per_mode = []
+        blocks = []
 
         print(f"→ Processing mod_pref = {mod_pref} ...")
 
         # ============================================================
-        # LOOP OVER EACH INJECTED MODE
+        # ACCIDENTS AFFECTING EACH INJECTED MODE (vectorized)
         # ============================================================
-        for idx_mode, N_inj in enumerate(injected_modes):
-
-            # Select neighbor injected modes
-            if idx_mode == 0:
-                neighbors = [injected_modes[0], injected_modes[1]]
-            elif idx_mode == len(injected_modes) - 1:
-                neighbors = [injected_modes[-2], injected_modes[-1]]
-            else:
-                neighbors = [
-                    injected_modes[idx_mode - 1],
-                    injected_modes[idx_mode],
-                    injected_modes[idx_mode + 1],
-                ]
-
-            # ============================================================
-            # CASE 1 → No accidents defined for this mod_pref
-            # ============================================================
-            if not accidents:
-                lines = [f"int{mod_pref} = 0.0"]
-
-            else:
-                # ============================================================
-                # CASE 2 → Determine which accidents affect the mode
-                # ============================================================
-                affecting_accidents = []
-
-                for (kg, p, N_star, ds, loglE, dloglE) in accidents:
-
-                    if mod_accident == 0:
-                        # =============== PARALLELOGRAM LOGIC ===============
-                        affects = any((N_star - ds) <= m <= (N_star + ds) for m in neighbors)
-
-                    else:
-                        # =============== RECTANGLE + PROJECTION ===============
-                        ymin, ymax = loglE - dloglE, loglE + dloglE
-                        xmin, xmax = N_star - ds, N_star + ds
-
-                        # Projected x-range
-                        xmin_proj = xmin + (reference_line_y - ymax)
-                        xmax_proj = xmax + (reference_line_y - ymin)
-
-                        affects = any(xmin_proj <= m <= xmax_proj for m in neighbors)
-
-                    if affects:
-                        affecting_accidents.append((kg, p, N_star, ds, loglE, dloglE))
-
-                # ============================================================
-                # WRITE .inc BLOCK FOR THIS MODE
-                # ============================================================
-                if not affecting_accidents:
-                    lines = [f"int{mod_pref} = 0.0"]
-
-                else:
-                    modes_with_accidents.append(idx_mode + 1)
+        # Every accident covers an interval of injection points: the modes of
+        # the grid inside it are a contiguous range [first, last) found with
+        # searchsorted, and a mode is affected when one of its neighbors
+        # (i-1, i, i+1, clipped at the ends) is inside, i.e. i in [first-1, last].
+        affected_range, hit = accident_mode_ranges(accidents, mod_accident, injected, reference_line_y)
+
+        # (mode, accident) pairs, sorted by mode and, within a mode, in the input order
+        counts = np.where(hit, affected_range[:, 1] - affected_range[:, 0], 0)
+        pair_accident = np.repeat(np.arange(len(counts)), counts)
+        pair_mode = np.repeat(affected_range[:, 0], counts) + np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        order = np.lexsort((pair_accident, pair_mode))
+        pair_accident, pair_mode = pair_accident[order], pair_mode[order]
+        bounds = np.searchsorted(pair_mode, np.arange(len(injected_modes) + 1))
+
+        # add_accident(kgamma, p, N_star, delta_star, loglE, delta_loglE), written once per accident
+        if isinstance(accidents, np.ndarray):
+            accident_tuples = accident_table(accidents).tolist()
+        else:
+            accident_tuples = [tuple(acc) for acc in accidents]
+        calls = [
+            f"call add_accident({kg}, {p}, {Ns}, {ds}, {loglE}, {dloglE})"
+            for (kg, p, Ns, ds, loglE, dloglE) in accident_tuples
+        ]
 
-                    lines = [
-                        f"! --- AUTOGENERATED: accidents affecting mode {N_inj:.1f} ---"
-                    ]
+        # Blocks whose content did not change are not written again
+        previous = read_block_manifest(os.path.join(pref_folder, f"int{mod_pref}_block_manifest.dat")) or {}
 
-                    base = f"int{mod_pref} ="
+        # ============================================================
+        # WRITE .inc BLOCK FOR EACH MODE
+        # ============================================================
+        for idx_mode, N_inj in enumerate(injected_modes):
+            selected = pair_accident[bounds[idx_mode]:bounds[idx_mode + 1]]
 
-                    for j, (kg, p, Ns, ds, loglE, dloglE) in enumerate(affecting_accidents):
-                        call = (
-                            f"Accident_Source(y, {kg}, {p}, kcom, N_ref, "
-                            f"{Ns}, {ds}, {loglE}, {dloglE})"
-                        )
+            if len(selected) == 0:
+                lines = ["! No accidents"]
+            else:
+                modes_with_accidents.append(idx_mode + 1)
+                lines = [f"! --- AUTOGENERATED: accidents affecting mode {N_inj:.1f} ---"]
+                lines.extend(calls[j] for j in selected)
 
-                        if j == 0:
-                            if len(affecting_accidents) == 1:
-                                lines.append(f"{base} {call}")
-                            else:
-                                lines.append(f"{base} {call} + &")
-                        elif j == len(affecting_accidents) - 1:
-                            lines.append(f"{' ' * len(base)} {call}")
-                        else:
-                            lines.append(f"{' ' * len(base)} {call} + &")
+            accidents_per_mode.append([accident_tuples[j] for j in selected])
+            blocks.append("\n".join(lines))
 
             # Save block file
             block_file = os.path.join(
                 pref_folder, f"int{mod_pref}_block_{idx_mode+1:03d}.inc"
             )
-            with open(block_file, "w") as f:
-                f.write("\n".join(lines))
+            if previous.get(idx_mode + 1) != block_hash(blocks[-1]) or not os.path.exists(block_file):
+                with open(block_file, "w") as f:
+                    f.write(blocks[-1])
 
             total_files += 1
 
@@ -167,31 +172,38 @@ def make_split_incs(configurations, mode, param_sets, reference_line_y):
 
             modes_with_accidents.sort()
 
-            for i, mode_num in enumerate(modes_with_accidents):
-                if i == 0:
-                    summary.append(f"if (iter_inj == {mode_num}) then")
-                else:
-                    summary.append(f"else if (iter_inj == {mode_num}) then")
+            # Constant-time dispatch on the injected mode
+            summary.append("select case (iter_inj)")
 
+            for mode_num in modes_with_accidents:
+                summary.append(f"    case ({mode_num})")
                 summary.append(
-                    f"    include '../int{mod_pref}_block_file/int{mod_pref}_block_{mode_num:03d}.inc'"
+                    f"        include '../int{mod_pref}_block_file/int{mod_pref}_block_{mode_num:03d}.inc'"
                 )
 
-            summary.append("else")
-            summary.append(f"    int{mod_pref} = 0.0")
-            summary.append("end if")
+            summary.append("end select")
 
         else:
             summary.append("! No modes affected")
-            summary.append(f"int{mod_pref} = 0.0")
 
         summary_file = os.path.join(pref_folder, f"int{mod_pref}_summary.inc")
         with open(summary_file, "w") as f:
             f.write("\n".join(summary))
 
+        # Affected modes (used by fortran_affected_only)
+        write_affected_modes(pref_folder, mod_pref, modes_with_accidents)
+
+        # Runtime accident table (used by fortran_accident_table)
+        write_accident_table(pref_folder, mod_pref, mod_accident, accidents_per_mode)
+
+        # Block hashes (used by run_simulation(..., changed_only=True))
+        changed = write_block_manifest(pref_folder, mod_pref, blocks)
+
         total_modes_with_accidents += len(modes_with_accidents)
 
         print(f"  Modes with accidents: {len(modes_with_accidents)}")
+        print(f"  Modes changed since the last call: {len(changed)}"
+              + (f" {changed[:10]}{' ...' if len(changed) > 10 else ''}" if changed else ""))
 
     print("\n=== Global summary ===")
     print(f"Total .inc files generated: {total_files}")
@@ -200,6 +212,37 @@ def make_split_incs(configurations, mode, param_sets, reference_line_y):
 
 
 
+def accident_mode_ranges(accidents, mod_accident, injected, reference_line_y):
+    """
+    Range of injected modes affected by each accident (see `make_split_incs`).
+
+    Returns (ranges, hit): `ranges[j] = [start, stop)` (0-based mode indices) and
+    `hit[j]` False when no injection point lies inside the interval of accident j.
+    The intervals are:
+        mod_accident = 0 → [N_star - ds, N_star + ds]          (PARALLELOGRAM)
+        mod_accident = 1 → rectangle projected along the
+                           diagonal onto reference_line_y       (RECTANGLE + PROJECTION)
+    """
+    table = accident_table(accidents)
+    N_star, ds = table["N_star"], table["delta_star"]
+    loglE, dloglE = table["loglE"], table["delta_loglE"]
+
+    if mod_accident == 0:
+        lo, hi = N_star - ds, N_star + ds
+    else:
+        ymin, ymax = loglE - dloglE, loglE + dloglE
+        xmin, xmax = N_star - ds, N_star + ds
+        lo = xmin + (reference_line_y - ymax)
+        hi = xmax + (reference_line_y - ymin)
+
+    # Injection points inside [lo, hi]: first ... last - 1
+    first = np.searchsorted(injected, lo, side="left")
+    last = np.searchsorted(injected, hi, side="right")
+
+    ranges = np.stack([np.maximum(first - 1, 0), np.minimum(last + 1, len(injected))], axis=1)
+    return ranges, last > first
+
+
 # =====================================================================
 # Accident Preview Plotter
 # =====================================================================
@@ -214,9 +257,28 @@ def preview_accidents(
         save=False,
         output_prefix="Preview",
         formats=("pdf",),
+        draft=False,
+        rasterize=None,
+        export_workers=None,
     ):
+    """
+    One figure per configuration with its accidents over the reference
+    evolution (ellipse trajectories and horizon of `structure_ref`).
+
+    The accidents of a configuration are drawn as a single PolyCollection
+    (parallelograms for mod_accident = 0, rectangles otherwise), colored by
+    kgamma. With `rasterize` (DEFAULT: more than 1000 accidents) that layer is
+    embedded as an image in vector formats, which keeps large grids light.
+
+    With `draft=True` the figures use mathtext instead of LaTeX (see
+    `styles_format.draft_style`) and are saved at 100 dpi instead of 500.
+    With `save=True` and `export_workers=n`, the files of the configurations
+    are written by n processes in parallel.
+    """
+    rc = draft_style() if draft else {}
+    dpi = 100 if draft else 500
+    label = mathtext_label if draft else (lambda text: text)
 
-    
     # Get label dictionary based on mode
     ylabel_dict = get_ylabel_dict(mode)
     
@@ -224,168 +286,170 @@ def preview_accidents(
     config_vmax = {}
     for mod_pref, cfg in configurations.items():
         accidents = cfg.get("accidents", [])
-        if accidents:
-            max_kgamma = max(abs(acc[0]) for acc in accidents)
+        if len(accidents):
+            max_kgamma = np.abs(accident_table(accidents)["kgamma"]).max()
             config_vmax[mod_pref] = max_kgamma
         else:
             config_vmax[mod_pref] = 1.0  # Default value
     
     figures = []
+    exports = []
     
-    # Process each configuration
-    for mod_pref, cfg in configurations.items():
-        # Get accidents and mod_accident for this configuration
-        accidents = cfg.get("accidents", [])
-        mod_accident = cfg["case_custom"]["fortran_mod_accident"]
+    # Process each configuration (with the rc settings of the draft mode)
+    with plt.rc_context(rc):
+        for mod_pref, cfg in configurations.items():
+            # Get accidents and mod_accident for this configuration
+            accidents = cfg.get("accidents", [])
+            mod_accident = cfg["case_custom"]["fortran_mod_accident"]
         
-        # Create figure
-        fig, ax = plt.subplots(figsize=(6, 4), constrained_layout=True)
+            # Create figure
+            fig, ax = plt.subplots(figsize=(6, 4), constrained_layout=True)
         
-        # Get vmax for this configuration
-        vmax = config_vmax[mod_pref]
+            # Get vmax for this configuration
+            vmax = config_vmax[mod_pref]
         
-        # Set up colormap and normalization
-        if log_scale:
-            norm = mcolors.SymLogNorm(linthresh=1e-4, linscale=1, vmin=-vmax, vmax=+vmax)
-        else:
-            norm = mcolors.Normalize(vmin=-vmax, vmax=+vmax)
+            # Set up colormap and normalization
+            if log_scale:
+                norm = mcolors.SymLogNorm(linthresh=1e-4, linscale=1, vmin=-vmax, vmax=+vmax)
+            else:
+                norm = mcolors.Normalize(vmin=-vmax, vmax=+vmax)
         
-        #cmap = mcolors.LinearSegmentedColormap.from_list(
-        #    "custom", ["#E3D05B", "white", "#A67A50"]
-        #)
-        cmap = mcolors.LinearSegmentedColormap.from_list(
-        "custom", ["#321dc3", "#ff7500"]
-        )
+            #cmap = mcolors.LinearSegmentedColormap.from_list(
+            #    "custom", ["#E3D05B", "white", "#A67A50"]
+            #)
+            cmap = mcolors.LinearSegmentedColormap.from_list(
+            "custom", ["#321dc3", "#ff7500"]
+            )
         
-        # Plot ellipse from reference structure
-        if structure_ref["ellipse"]:
-            first_ellipse_key = list(structure_ref["ellipse"].keys())[0]
+            # Plot ellipse from reference structure
+            if structure_ref["ellipse"]:
+                first_ellipse_key = list(structure_ref["ellipse"].keys())[0]
             
-            # Plot ellipse trajectories
-            for i, ellipse_key in enumerate(structure_ref["ellipse"].keys()):
-                if structure_ref["ellipse"][ellipse_key] is not None:
-                    ax.plot(
-                        structure_ref["ellipse"][ellipse_key]["N"], 
-                        structure_ref["ellipse"][ellipse_key]["logL"], 
-                        linestyle='--', color='black', lw=2.0, alpha=0.2, zorder=10
-                    )
-                    
-                    # Add arrows
-                    for y_arrow in [8.0, 12.0]:
-                        x_arrow = y_arrow + structure_ref["ellipse"][ellipse_key]["N"][0] - reference_line_y
-                        dx, dy = 0.1, 0.1
-                        ax.annotate(
-                            "",
-                            xy=(x_arrow + dx, y_arrow + dy), 
-                            xytext=(x_arrow, y_arrow),
-                            arrowprops=dict(
-                                arrowstyle="->", 
-                                color='black',
-                                lw=2.0, alpha=0.2
-                            ), 
-                            zorder=10
+                # Plot ellipse trajectories
+                for i, ellipse_key in enumerate(structure_ref["ellipse"].keys()):
+                    if structure_ref["ellipse"][ellipse_key] is not None:
+                        ax.plot(
+                            structure_ref["ellipse"][ellipse_key]["N"], 
+                            structure_ref["ellipse"][ellipse_key]["logL"], 
+                            linestyle='--', color='black', lw=2.0, alpha=0.2, zorder=10
                         )
+                    
+                        # Add arrows
+                        for y_arrow in [8.0, 12.0]:
+                            x_arrow = y_arrow + structure_ref["ellipse"][ellipse_key]["N"][0] - reference_line_y
+                            dx, dy = 0.1, 0.1
+                            ax.annotate(
+                                "",
+                                xy=(x_arrow + dx, y_arrow + dy), 
+                                xytext=(x_arrow, y_arrow),
+                                arrowprops=dict(
+                                    arrowstyle="->", 
+                                    color='black',
+                                    lw=2.0, alpha=0.2
+                                ), 
+                                zorder=10
+                            )
             
-            # Fill inside/outside horizon regions
-            ax.fill_between(
-                structure_ref["ellipse"][first_ellipse_key]["N"], 
-                np.log(1.0/structure_ref["ellipse"][first_ellipse_key]["Hubble"]), 
-                80.0,
-                color='#a5c8e1', alpha=1.0, label='Outside horizon'
-            )
-            ax.fill_between(
-                structure_ref["ellipse"][first_ellipse_key]["N"], 
-                0.0, 
-                np.log(1.0/structure_ref["ellipse"][first_ellipse_key]["Hubble"]),
-                color='#ffc491', alpha=1.0, label='Inside horizon'
-            )
+                # Fill inside/outside horizon regions
+                ax.fill_between(
+                    structure_ref["ellipse"][first_ellipse_key]["N"], 
+                    np.log(1.0/structure_ref["ellipse"][first_ellipse_key]["Hubble"]), 
+                    80.0,
+                    color='#a5c8e1', alpha=1.0, label='Outside horizon'
+                )
+                ax.fill_between(
+                    structure_ref["ellipse"][first_ellipse_key]["N"], 
+                    0.0, 
+                    np.log(1.0/structure_ref["ellipse"][first_ellipse_key]["Hubble"]),
+                    color='#ffc491', alpha=1.0, label='Inside horizon'
+                )
             
-            # Plot constant kphys and Hubble lines
-            ax.plot(
-                structure_ref["ellipse"][first_ellipse_key]["N"], 
-                np.log(1.0/structure_ref["ellipse"][first_ellipse_key]["kphys"]), 
-                color='b', linestyle='--', lw=1.5, alpha=0.8
-            )
-            ax.plot(
-                structure_ref["ellipse"][first_ellipse_key]["N"], 
-                np.log(1.0/structure_ref["ellipse"][first_ellipse_key]["Hubble"]), 
-                color='red', linestyle='-', lw=2.0, alpha=0.7
-            )
+                # Plot constant kphys and Hubble lines
+                ax.plot(
+                    structure_ref["ellipse"][first_ellipse_key]["N"], 
+                    np.log(1.0/structure_ref["ellipse"][first_ellipse_key]["kphys"]), 
+                    color='b', linestyle='--', lw=1.5, alpha=0.8
+                )
+                ax.plot(
+                    structure_ref["ellipse"][first_ellipse_key]["N"], 
+                    np.log(1.0/structure_ref["ellipse"][first_ellipse_key]["Hubble"]), 
+                    color='red', linestyle='-', lw=2.0, alpha=0.7
+                )
         
-        # Plot accidents
-        for (kgamma, p, N_star, delta_star, loglE, delta_loglE) in accidents:
-            ymin = loglE - delta_loglE
-            ymax = loglE + delta_loglE
-            
-            color = cmap(norm(kgamma))
-            
+            # Plot accidents: one polygon per accident, in a single collection
+            table = accident_table(accidents)
+            ymin = table["loglE"] - table["delta_loglE"]
+            ymax = table["loglE"] + table["delta_loglE"]
+            xmin = table["N_star"] - table["delta_star"]
+            xmax = table["N_star"] + table["delta_star"]
+
             if mod_accident == 0:
                 # Parallelogram logic
-                xmin_base = N_star - delta_star
-                xmax_base = N_star + delta_star
                 ymin_shift = ymin - reference_line_y
                 ymax_shift = ymax - reference_line_y
-                
-                vertices = [
-                    (xmin_base + ymin_shift, ymin),
-                    (xmax_base + ymin_shift, ymin),
-                    (xmax_base + ymax_shift, ymax),
-                    (xmin_base + ymax_shift, ymax),
-                ]
-                
-                polygon = patches.Polygon(
-                    vertices,
-                    closed=True,
-                    facecolor=color,
-                    linestyle='--',
-                    alpha=0.9,
-                    zorder=5
-                )
-                ax.add_patch(polygon)
-                
+                x_vertices = [xmin + ymin_shift, xmax + ymin_shift, xmax + ymax_shift, xmin + ymax_shift]
             else:
                 # Rectangle logic
-                xmin = N_star - delta_star
-                xmax = N_star + delta_star
-                rect = patches.Rectangle(
-                    (xmin, ymin), 
-                    xmax - xmin, 
-                    ymax - ymin,
-                    facecolor=color,
-                    linestyle='--',
-                    alpha=0.9,
-                    zorder=5
-                )
-                ax.add_patch(rect)
-        
-        # Set labels and styling
-        ax.set_xlabel(ylabel_dict['N'], fontsize=16)
-        ax.set_ylabel(ylabel_dict['logL'], fontsize=16)
-        ax.grid(True, which="both", ls="--", alpha=0.5)
+                x_vertices = [xmin, xmax, xmax, xmin]
+            y_vertices = [ymin, ymin, ymax, ymax]
+
+            # vertices: (accidents, 4 corners, x/y)
+            vertices = np.stack([np.stack(x_vertices, axis=1), np.stack(y_vertices, axis=1)], axis=2)
+            layer = PolyCollection(
+                vertices,
+                facecolors=cmap(norm(table["kgamma"])),
+                linestyle='--',
+                alpha=0.9,
+                zorder=5
+            )
+            layer.set_rasterized(len(table) > 1000 if rasterize is None else rasterize)
+            ax.add_collection(layer)
         
-        # Set limits if we have ellipse data
-        if structure_ref["ellipse"] and first_ellipse_key in structure_ref["ellipse"]:
-            ellipse_data = structure_ref["ellipse"][first_ellipse_key]
-            ax.set_xlim(ellipse_data["N"][0], ellipse_data["N"][-1])
+            # Set labels and styling
+            ax.set_xlabel(label(ylabel_dict['N']), fontsize=16)
+            ax.set_ylabel(label(ylabel_dict['logL']), fontsize=16)
+            ax.grid(True, which="both", ls="--", alpha=0.5)
         
-        ax.set_ylim(3.0, 15.5)
+            # Set limits if we have ellipse data
+            if structure_ref["ellipse"] and first_ellipse_key in structure_ref["ellipse"]:
+                ellipse_data = structure_ref["ellipse"][first_ellipse_key]
+                ax.set_xlim(ellipse_data["N"][0], ellipse_data["N"][-1])
         
-        # Add colorbar
-        sm = plt.cm.ScalarMappable(cmap=cmap, norm=norm)
-        sm.set_array([])
-        cbar = plt.colorbar(sm, ax=ax, orientation='vertical', location='right')
-        cbar.set_label('$\\displaystyle{\\alpha_{\\Gamma}}$', fontsize=16)
+            ax.set_ylim(3.0, 15.5)
         
-        # Save if requested
-        if save:
-            base_name = f"{output_prefix}_Case_{mod_pref}"
-            for fmt in formats:
-                fig.savefig(f"{base_name}.{fmt}", dpi=500, bbox_inches='tight')
+            # Add colorbar
+            sm = plt.cm.ScalarMappable(cmap=cmap, norm=norm)
+            sm.set_array([])
+            cbar = plt.colorbar(sm, ax=ax, orientation='vertical', location='right')
+            cbar.set_label(label('$\\displaystyle{\\alpha_{\\Gamma}}$'), fontsize=16)
+
+            # Draw once with the style of the figure (ticks are created when drawing)
+            if draft:
+                fig.canvas.draw()
+
+            # Save if requested
+            if save:
+                exports.append((fig, f"{output_prefix}_Case_{mod_pref}", formats, dpi, rc))
         
-        figures.append(fig)
+            figures.append(fig)
+    
+    # Export (in parallel with export_workers)
+    if export_workers and len(exports) > 1:
+        with ProcessPoolExecutor(max_workers=export_workers) as pool:
+            list(pool.map(save_figure, *zip(*exports)))
+    else:
+        for export in exports:
+            save_figure(*export)
     
     return figures
 
+
+def save_figure(fig, base_name, formats, dpi, rc=None):
+    """Save `fig` as `base_name.<fmt>` for every format (rc settings of its style)."""
+    with plt.rc_context(rc or {}):
+        for fmt in formats:
+            fig.savefig(f"{base_name}.{fmt}", dpi=dpi, bbox_inches='tight')
+
 # =====================================================================
 # Grid for accidentes
 # =====================================================================
@@ -403,8 +467,23 @@ def generate_rectangular_grid(
         default_kgamma=0.09,
         default_p=3.0,
         slope=0.0,
-        norm_matrix=None
+        norm_matrix=None,
+        merge_tolerance=None,
+        transition=None,
+        rng=None
     ):
+    """
+    Accident grid: one rectangle per tile of an x_divisions × y_divisions grid,
+    returned as an ACCIDENT_DTYPE array (row by row, from the bottom one).
+    With `norm_matrix` (e.g. an image resized to the grid) kgamma =
+    default_kgamma * pixel value, otherwise its sign is random, drawn from
+    `rng` (a `np.random.Generator`, for reproducible grids) or from the
+    global `np.random` state if None.
+
+    With `merge_tolerance` (e.g. 0.0 for equal values), adjacent tiles are merged
+    into larger rectangles (see `merge_tiles`), which needs hard windows:
+    `transition` is the fortran_transition of the run and must be 1.0.
+    """
     
     xmin, xmax = x_limits
     ymin, ymax = y_limits
@@ -419,47 +498,123 @@ def generate_rectangular_grid(
         y_divisions
     )
 
-    grid_parameters = []
-    
-    for j, y_center in enumerate(y_centers):
-        # Calculate displacement for this row
-        y_relative = y_center - ymin
-        total_displacement = slope * (ymax - ymin)  # Maximum displacement
-        
-        # RECALCULATE available space in X for this row
-        available_x_space = (xmax - xmin) - 2.0 * horizontal_margin - total_displacement
-        
-        # Recalculate width and spacing to maintain proportion
-        total_x_width = available_x_space - (x_divisions - 1.0) * horizontal_spacing
-        rect_width_x = total_x_width / x_divisions
-        
-        # Initial X position for this row (considering displacement)
-        x_start = xmin + horizontal_margin + (total_displacement * y_relative / (ymax - ymin))
-        
-        # X centers for this specific row
-        x_centers_row = np.linspace(
-            x_start + rect_width_x / 2.0,
-            x_start + rect_width_x / 2.0 + (x_divisions - 1.0) * (rect_width_x + horizontal_spacing),
-            x_divisions
-        )
-        
-        for i, x_center in enumerate(x_centers_row):
-            if norm_matrix is not None:
-                value = norm_matrix[y_divisions - 1 - j, i]
-                kgamma = default_kgamma * value
-            else:
-                kgamma = default_kgamma * ((-1) ** np.random.randint(1, 3))
-            
-            # NEW STRUCTURE
-            grid_parameters.append((
-                kgamma,
-                default_p,
-                x_center,           # (X center)
-                rect_width_x / 2.0,   # (half-width)
-                y_center,           # loglE (Y center)
-                rect_height_y / 2.0     # delta_loglE (half-height)
-            ))
+    # Displacement of each row (same width for every row)
+    y_relative = y_centers - ymin
+    total_displacement = slope * (ymax - ymin)  # Maximum displacement
+
+    available_x_space = (xmax - xmin) - 2.0 * horizontal_margin - total_displacement
+    total_x_width = available_x_space - (x_divisions - 1.0) * horizontal_spacing
+    rect_width_x = total_x_width / x_divisions
+
+    # Initial X position of each row (considering displacement)
+    x_start = xmin + horizontal_margin + (total_displacement * y_relative / (ymax - ymin))
+
+    # X centers: one row per y_center
+    x_centers = np.linspace(
+        x_start + rect_width_x / 2.0,
+        x_start + rect_width_x / 2.0 + (x_divisions - 1.0) * (rect_width_x + horizontal_spacing),
+        x_divisions,
+        axis=1
+    )
+
+    if norm_matrix is not None:
+        kgamma = default_kgamma * np.asarray(norm_matrix)[::-1, :]
+    elif rng is not None:
+        kgamma = default_kgamma * (-1.0) ** rng.integers(1, 3, size=(y_divisions, x_divisions))
+    else:
+        kgamma = default_kgamma * (-1.0) ** np.random.randint(1, 3, size=(y_divisions, x_divisions))
+
+    grid_parameters = np.empty(y_divisions * x_divisions, dtype=ACCIDENT_DTYPE)
+    grid_parameters["kgamma"] = kgamma.ravel()
+    grid_parameters["p"] = default_p
+    grid_parameters["N_star"] = x_centers.ravel()                             # (X center)
+    grid_parameters["delta_star"] = rect_width_x / 2.0                        # (half-width)
+    grid_parameters["loglE"] = np.repeat(y_centers, x_divisions)              # loglE (Y center)
+    grid_parameters["delta_loglE"] = rect_height_y / 2.0                      # delta_loglE (half-height)
+
+    if merge_tolerance is not None:
+        grid_parameters = merge_tiles(grid_parameters, transition, merge_tolerance)
 
     return grid_parameters
 
 
+def merge_tiles(accidents, transition, tolerance=0.0):
+    """
+    Merge adjacent rectangular accidents (tiles of `generate_rectangular_grid`)
+    with the same p and near-equal amplitude into larger rectangles, greedily:
+
+        1. along each row (same loglE, delta_loglE): runs of tiles whose edges touch
+        2. along each column: runs of row pieces with the same x-extent whose edges touch
+
+    A rectangle only has the source of its tiles with hard windows
+    (`transition` = fortran_transition = 1.0): each tapered window (< 1.0)
+    vanishes at the edges of its tile, which a merged rectangle would fill,
+    so tapered tiles are not merged (ValueError).
+
+    The source of a tile is proportional to a = sign(kgamma) * kgamma**2. A run
+    only grows while the spread of a over its tiles stays within `tolerance`
+    times their largest |a|, and the rectangle takes the area-weighted mean of
+    a: its source differs from the sum of the tiles by at most that fraction
+    at any point (tolerance = 0.0: only equal kgamma, the same source except on
+    the shared edges). Tiles separated by a spacing are never merged (the
+    merged rectangle would cover the gap). The reduction in the number of
+    accidents is printed, and the merged rectangles are returned as an
+    ACCIDENT_DTYPE array.
+    """
+    if transition is None or transition < 1.0:
+        raise ValueError(
+            f"Tiles can only be merged with hard windows (fortran_transition = 1.0), got {transition}."
+        )
+
+    def touching(a, b):
+        return abs(a - b) <= 1e-9 * max(1.0, abs(a), abs(b))
+
+    def merge_runs(pieces, key, lower, upper):
+        # pieces: [amin, amax, sum(a * area), area, x0, x1, y0, y1, p, original tile or None]
+        groups = {}
+        for piece in pieces:
+            groups.setdefault(key(piece), []).append(piece)
+
+        merged = []
+        for group in groups.values():
+            group.sort(key=lambda piece: piece[lower])
+            run = list(group[0])
+            for piece in group[1:]:
+                amin, amax = min(run[0], piece[0]), max(run[1], piece[1])
+                if touching(run[upper], piece[lower]) and amax - amin <= tolerance * max(abs(amin), abs(amax)):
+                    run[0], run[1] = amin, amax
+                    run[2] += piece[2]
+                    run[3] += piece[3]
+                    run[upper] = piece[upper]
+                    run[9] = None
+                else:
+                    merged.append(run)
+                    run = list(piece)
+            merged.append(run)
+        return merged
+
+    pieces = []
+    for (kg, p, N_star, ds, loglE, dloglE) in accident_table(accidents).tolist():
+        a = np.sign(kg) * kg * kg
+        area = 4.0 * ds * dloglE
+        pieces.append([a, a, a * area, area, N_star - ds, N_star + ds, loglE - dloglE, loglE + dloglE, p,
+                       (kg, p, N_star, ds, loglE, dloglE)])
+
+    rows = merge_runs(pieces, key=lambda piece: (piece[6], piece[7], piece[8]), lower=4, upper=5)
+    rectangles = merge_runs(rows, key=lambda piece: (piece[4], piece[5], piece[8]), lower=6, upper=7)
+
+    # Tiles that were not merged are kept as they are; equal amplitudes are kept exactly
+    merged = []
+    for (amin, amax, a_area, area, x0, x1, y0, y1, p, tile) in rectangles:
+        if tile is None:
+            a = amin if amin == amax else a_area / area
+            tile = (np.sign(a) * np.sqrt(abs(a)), p, (x0 + x1) / 2.0, (x1 - x0) / 2.0, (y0 + y1) / 2.0, (y1 - y0) / 2.0)
+        merged.append(tile)
+
+    if len(accidents):
+        print(f"Merged tiles: {len(accidents)} → {len(merged)} accidents "
+              f"({100.0 * (1.0 - len(merged) / len(accidents)):.1f}% fewer)")
+
+    return accident_table(merged)
+
+
@@ -1,6 +1,8 @@
 # modules_py/generate_fortran.py
 import os
+import hashlib
 from modules_py.architecture import MODE_FOLDERS
+from modules_py.output_format import template_columns
 
 """
 Module responsible for automatically building and generating the Fortran files needed
@@ -52,6 +54,12 @@ DEFAULT_PROFILES = {
             # If it is 10, an ellipse is printed every 10 injected modes
             # (only if fortran_ellipse = .true.).
             "fortran_ellipse_resolution": 10,
+            # Format of the power spectrum and ellipse files.
+            # .false. → text rows (ES24.16E3), read with np.loadtxt (DEFAULT).
+            # .true. → binary stream: a header (column names, mode, case, part) followed by
+            #          the raw rows, about 3× smaller and mapped without parsing (np.memmap)
+            #          by load_data / load_structure (see modules_py/output_format.py).
+            "fortran_binary_output": ".false.",
             # settings_background_and_kphys
             # Initial conditions for the inflaton field
             "initial_phi": 25.0,
@@ -75,8 +83,61 @@ DEFAULT_PROFILES = {
             # Second derivative of the potential with respect to φ.
             "fortran_Vprimeprime": "3.0 * 1.0d-14 * phi*phi",
             # settings_window
-            # Transition and smoothness parameter (]0,1[, 0.5 is recommended)
+            # Transition and smoothness parameter (]0,1], 0.5 is recommended;
+            # 1.0: hard windows, needed to merge tiles, see merge_tiles)
             "fortran_transition": 0.5,
+            # settings_optimization
+            # Reuse of the accident-free baseline (case 0, which must be run first).
+            # .true. → only the modes affected by at least one accident are integrated;
+            #          the remaining rows and ellipse files are copied from case 0.
+            # .false. → every injected mode is integrated (DEFAULT).
+            "fortran_affected_only": ".false.",
+            # Shared background table (injection states of every mode).
+            # .true. → the background is integrated once by a pre-pass and every part
+            #          (and every case with the same background) reads it from
+            #          MODE_FOLDERS[mode] / background_cache.
+            # .false. → each binary integrates its own background (DEFAULT).
+            "fortran_background_cache": ".false.",
+            # Runtime accident table.
+            # .true. → the sources do not depend on the case: accidents are read at startup
+            #          from intX_block_file / intX_accidents.bin (written by make_split_incs),
+            #          so a single compiled binary per part serves every case.
+            # .false. → accidents are compiled into each case from the .inc files (DEFAULT).
+            "fortran_accident_table": ".false.",
+            # Dynamic scheduling (set in a "Worker" parallel entry, see partition.worker_parallel).
+            # .true. → the binary integrates the modes it receives on stdin
+            #          (run_simulation(..., runner="workers")).
+            # .false. → the binary integrates its fortran_iter_initial..final range (DEFAULT).
+            "fortran_worker": ".false.",
+            # Adaptive step size of the gl8 integrator (step doubling).
+            # 0.0 → fixed step from the injection to the end of inflation (DEFAULT).
+            # > 0.0 → tolerance on the relative error per step: the step grows in powers of 2,
+            #         up to fortran_step_max_factor times the fixed step, and falls back to the
+            #         fixed step near accident windows and at the end of inflation.
+            "fortran_step_tol": 0.0,
+            # Largest adaptive step, in units of the fixed step (power of 2).
+            "fortran_step_max_factor": 64.0,
+            # Fixed-point iteration of the implicit gl8 stages.
+            # 0.0 → 16 sweeps from zero stages at every step (DEFAULT).
+            # > 0.0 → the sweeps stop once the relative change of every stage is below this
+            #         tolerance, warm-started from the stages of the previous step.
+            #         The sweeps of each mode are reported in the Timing_*.dat files.
+            "fortran_gl8_tol": 0.0,
+            # Most sweeps per step with fortran_gl8_tol > 0 (16 sweeps do not converge
+            # the first steps of a sub-horizon mode).
+            "fortran_gl8_max_sweeps": 64,
+            # WKB fast start of deep sub-horizon modes.
+            # 0.0 → the perturbations are integrated from the injection (DEFAULT).
+            # > 0.0 → only the background is evolved until k/(aH) falls to this value (≫ 1, e.g. 50),
+            #         where the perturbations start from WKB (adiabatic vacuum) data. Modes with
+            #         an accident window in the skipped interval start at the injection as usual.
+            "fortran_wkb_kaH": 0.0,
+            # Early termination of frozen super-horizon modes (single field only).
+            # 0.0 → the perturbations are integrated up to the end of inflation (DEFAULT).
+            # > 0.0 → once k/(aH) falls below this value and no accident of the mode has
+            #         support ahead, only the background is evolved and the perturbations
+            #         follow the frozen growing mode up to the end of inflation.
+            "fortran_freeze_kaH": 0.0,
         },
         # settings_iter_parallel
         # Configuration of parallelization by mode blocks.
@@ -135,6 +196,12 @@ DEFAULT_PROFILES = {
             # If it is 10, an ellipse is printed every 10 injected modes
             # (only if fortran_ellipse = .true.).
             "fortran_ellipse_resolution": 10,
+            # Format of the power spectrum and ellipse files.
+            # .false. → text rows (ES24.16E3), read with np.loadtxt (DEFAULT).
+            # .true. → binary stream: a header (column names, mode, case, part) followed by
+            #          the raw rows, about 3× smaller and mapped without parsing (np.memmap)
+            #          by load_data / load_structure (see modules_py/output_format.py).
+            "fortran_binary_output": ".false.",
             # settings_background_and_kphys
             # Initial conditions for the fields
             "initial_phi_1_two_field": 20.0,
@@ -166,8 +233,55 @@ DEFAULT_PROFILES = {
             # Second derivative of the potential with respect to φ₂φ₂
             "fortran_Vprimeprime_22_two_field": "(2.0*(1.0d-14))*phi(1)*phi(1)",
             # settings_window
-            # Transition and smoothness parameter (]0,1[, 0.5 is recommended)
+            # Transition and smoothness parameter (]0,1], 0.5 is recommended;
+            # 1.0: hard windows, needed to merge tiles, see merge_tiles)
             "fortran_transition": 0.5,
+            # settings_optimization
+            # Reuse of the accident-free baseline (case 0, which must be run first).
+            # .true. → only the modes affected by at least one accident are integrated;
+            #          the remaining rows and ellipse files are copied from case 0.
+            # .false. → every injected mode is integrated (DEFAULT).
+            "fortran_affected_only": ".false.",
+            # Shared background table (injection states of every mode).
+            # .true. → the background is integrated once by a pre-pass and every part
+            #          (and every case with the same background) reads it from
+            #          MODE_FOLDERS[mode] / background_cache.
+            # .false. → each binary integrates its own background (DEFAULT).
+            "fortran_background_cache": ".false.",
+            # Runtime accident table.
+            # .true. → the sources do not depend on the case: accidents are read at startup
+            #          from intX_block_file / intX_accidents.bin (written by make_split_incs),
+            #          so a single compiled binary per part serves every case.
+            # .false. → accidents are compiled into each case from the .inc files (DEFAULT).
+            "fortran_accident_table": ".false.",
+            # Dynamic scheduling (set in a "Worker" parallel entry, see partition.worker_parallel).
+            # .true. → the binary integrates the modes it receives on stdin
+            #          (run_simulation(..., runner="workers")).
+            # .false. → the binary integrates its fortran_iter_initial..final range (DEFAULT).
+            "fortran_worker": ".false.",
+            # Adaptive step size of the gl8 integrator (step doubling).
+            # 0.0 → fixed step from the injection to the end of inflation (DEFAULT).
+            # > 0.0 → tolerance on the relative error per step: the step grows in powers of 2,
+            #         up to fortran_step_max_factor times the fixed step, and falls back to the
+            #         fixed step near accident windows and at the end of inflation.
+            "fortran_step_tol": 0.0,
+            # Largest adaptive step, in units of the fixed step (power of 2).
+            "fortran_step_max_factor": 64.0,
+            # Fixed-point iteration of the implicit gl8 stages.
+            # 0.0 → 16 sweeps from zero stages at every step (DEFAULT).
+            # > 0.0 → the sweeps stop once the relative change of every stage is below this
+            #         tolerance, warm-started from the stages of the previous step.
+            #         The sweeps of each mode are reported in the Timing_*.dat files.
+            "fortran_gl8_tol": 0.0,
+            # Most sweeps per step with fortran_gl8_tol > 0 (16 sweeps do not converge
+            # the first steps of a sub-horizon mode).
+            "fortran_gl8_max_sweeps": 64,
+            # WKB fast start of deep sub-horizon modes.
+            # 0.0 → the perturbations are integrated from the injection (DEFAULT).
+            # > 0.0 → only the background is evolved until k/(aH) falls to this value (≫ 1, e.g. 50),
+            #         where the perturbations start from WKB (adiabatic vacuum) data. Modes with
+            #         an accident window in the skipped interval start at the injection as usual.
+            "fortran_wkb_kaH": 0.0,
             # settings_environment / interactions
             # Generic
             # Form of linear coupling with the environment, shown in readable format.
@@ -216,6 +330,33 @@ DEFAULT_PROFILES = {
     },
 }
 
+# -------------------------
+# Parameters that determine the background
+# -------------------------
+# Two parameter sets with the same values for these keys (and the same template)
+# share the background table: kphys, dt and the injection state of every mode.
+BACKGROUND_KEYS = {
+    "single": [
+        "fortran_N_mod", "fortran_N_step", "fortran_N_initial_inj",
+        "initial_phi", "initial_phi_dot", "initial_ln_a", "fortran_kphys",
+        "fortran_Vphi", "fortran_Vprime", "fortran_Vprimeprime",
+        "fortran_gl8_tol", "fortran_gl8_max_sweeps",
+    ],
+    "two_field": [
+        "fortran_N_mod", "fortran_N_step", "fortran_N_initial_inj",
+        "initial_phi_1_two_field", "initial_phi_2_two_field",
+        "initial_phi_dot_1_two_field", "initial_phi_dot_2_two_field",
+        "initial_ln_a", "fortran_kphys",
+        "fortran_Vphi_two_field", "fortran_Vprime_1_two_field", "fortran_Vprime_2_two_field",
+        "fortran_Vprimeprime_11_two_field", "fortran_Vprimeprime_12_two_field",
+        "fortran_Vprimeprime_22_two_field",
+        "fortran_gl8_tol", "fortran_gl8_max_sweeps",
+    ],
+}
+
+BACKGROUND_FOLDER = "background_cache"
+
+
 # -------------------------
 # Load template from folder
 # -------------------------
@@ -288,6 +429,26 @@ def generate_fortran_files(template_text, mode, param_sets, output_root=None):
 
     generated = []
 
+    # Shared background table: role 1 (pre-pass) writes it, role 2 (parts) reads it
+    use_background = str(param_sets[0].get("fortran_background_cache", ".false.")).strip().lower() in [".true."]
+    overrides = {"fortran_background_role": 0, "fortran_background_file": "", **template_columns(mode)}
+
+    if use_background:
+        tag = background_tag(template_text, mode, param_sets[0])
+        overrides.update({
+            "fortran_background_role": 2,
+            "fortran_background_file": f"../{BACKGROUND_FOLDER}/{tag}.bin",
+        })
+        write_background_source(template_text, mode, param_sets[0], tag, output_root)
+
+    # Runtime accident table: case-independent sources (the case comes from the table)
+    if str(param_sets[0].get("fortran_accident_table", ".false.")).strip().lower() in [".true."]:
+        overrides["fortran_mod_pref"] = 0
+
+    # The runner finds the table of this case here (empty: no shared table)
+    with open(os.path.join(target_dir, f"Background_{mod_pref:03d}.txt"), "w") as f:
+        f.write(f"{tag}\n" if use_background else "")
+
     for params in param_sets:
 
         if mode == "single":
@@ -298,10 +459,59 @@ def generate_fortran_files(template_text, mode, param_sets, output_root=None):
         out_path = os.path.join(target_dir, fname)
 
         with open(out_path, "w") as f:
-            f.write(template_text.format(**params))
+            f.write(template_text.format(**{**params, **overrides}))
 
         generated.append(out_path)
         print(f"[OK] Generated: {out_path}")
 
     return generated
 
+
+# -------------------------
+# Shared background table
+# -------------------------
+def background_tag(template_text, mode, params):
+    """
+    Name of the background table for a parameter set: `Background_<hash>`,
+    where the hash covers the template and the values of `BACKGROUND_KEYS[mode]`.
+    Cases and parts that only differ in accidents, ranges or outputs share it.
+    """
+    if mode not in BACKGROUND_KEYS:
+        raise ValueError(f"Unknown mode '{mode}'.")
+
+    digest = hashlib.sha1(template_text.encode())
+    for key in BACKGROUND_KEYS[mode]:
+        digest.update(f"{key}={params[key]!r};".encode())
+
+    return f"Background_{digest.hexdigest()[:12]}"
+
+
+def write_background_source(template_text, mode, params, tag, output_root=None):
+    """
+    Write the background pre-pass (`fortran_background_role = 1`) into
+
+        MODE_FOLDERS[mode] / background_cache / Background_<hash>.f90
+
+    Once compiled and executed inside that folder it writes
+    `Background_<hash>.bin` (kphys, dt and the state at every injection point)
+    and stops, before any perturbation is evolved.
+    """
+    output_root = output_root or MODE_FOLDERS[mode]
+    cache_dir = os.path.join(output_root, BACKGROUND_FOLDER)
+    os.makedirs(cache_dir, exist_ok=True)
+
+    out_path = os.path.join(cache_dir, f"{tag}.f90")
+    prepass = {
+        **params,
+        "fortran_part_iter_parallel": "Background",
+        "fortran_iter_initial": 1,
+        "fortran_iter_final": params["fortran_N_mod"],
+        "fortran_background_role": 1,
+        "fortran_background_file": f"{tag}.bin",
+        **template_columns(mode),
+    }
+
+    with open(out_path, "w") as f:
+        f.write(template_text.format(**prepass))
+
+    return out_path
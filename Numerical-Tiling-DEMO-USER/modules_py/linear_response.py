@@ -0,0 +1,344 @@
+# modules_py/linear_response.py
+import os
+import json
+import time
+import hashlib
+import numpy as np
+from modules_py.architecture import MODE_FOLDERS
+from modules_py.configurations import accident_table
+from modules_py.generate_fortran import BACKGROUND_KEYS
+from modules_py.load_data import LazyData
+from modules_py.numpy_engine import (
+    ACCIDENT_FIELDS, AccidentPairs, SingleFieldEquations, evolve_modes, injection_points
+)
+from modules_py.output_format import OUTPUT_COLUMNS
+
+"""
+Linear response of the power spectrum to the accidents of a tile basis (single field).
+
+The source of an accident is linear in its amplitude a = sign(kgamma) kgamma², so
+for small kgamma the change of zeta of each mode is close to linear in the
+amplitude of every tile:
+
+    zeta(a) ≈ zeta_0 + K @ a,    K[mode, tile] = d zeta / d a   (at a = 0)
+
+`response_kernel` computes K for a tile basis (e.g. `generate_rectangular_grid`
+without merging) in a single run of the NumPy engine: around the accident-free
+evolution (case 0), every (mode, tile) pair whose window the mode crosses
+carries a linearized perturbation (`TangentLinear`). The kernel is cached in
+MODE_FOLDERS[mode] / response_cache, and `linear_spectrum` then evaluates any
+environment on the same tiles as a weighted sum, with an estimate of the
+neglected second-order term, and integrates in full only the modes touched by
+tiles whose amplitude exceeds the linearity threshold.
+"""
+
+RESPONSE_FOLDER = "response_cache"
+
+# Parameters that determine the kernel, besides the background and the tiles
+RESPONSE_KEYS = ["fortran_mod_accident", "fortran_transition", "fortran_gl8_max_sweeps"]
+
+
+# ============================================================
+# Linearized perturbations
+# ============================================================
+
+def concat_vectors(a, b):
+    """Concatenation of two dicts of arrays with the same keys (vectors along the last axis)."""
+    return {name: np.concatenate([a[name], b[name]], axis=-1) for name in a}
+
+
+def take_vectors(vectors, mask):
+    """Vectors of a dict of arrays selected by `mask` (along the last axis)."""
+    return {name: values[..., mask] for name, values in vectors.items()}
+
+
+class TangentLinear:
+    """
+    First-order response of the perturbations (L_k, L_k', theta_k') of every
+    mode to each tile of `tiles` at unit amplitude (sign(kgamma) kgamma² = 1),
+    around the evolution without accidents, evolved by `evolve_modes` along
+    with the modes.
+
+    Each (mode, tile) pair whose window the mode crosses gets a vector `dy`
+    from the step where its window opens. Once every window of a mode has
+    closed, its vectors only follow the homogeneous linearized equations, so
+    they are replaced by their values (`folded`) and three basis solutions of
+    that mode, which carry them to the end of inflation. With freeze_kaH > 0,
+    the basis solutions stop once k/(aH) falls below it: on super-horizon
+    scales d L_k / L_k is frozen (as fortran_freeze_kaH for the modes).
+    `response[i, tile]` is d L_k / d a of mode i at the end.
+    """
+
+    def __init__(self, equations, N_ref, tiles, freeze_kaH=0.0):
+        unit = np.array(tiles, dtype=np.float64).reshape(-1, 6)
+        unit[:, 0] = 1.0
+        self.equations = equations
+        self.freeze_kaH = freeze_kaH
+        self.pairs = AccidentPairs(equations, N_ref, unit)
+        self.response = np.zeros((len(N_ref), len(unit)))
+        self.reset()
+
+    def reset(self):
+        empty = self.pairs.supports(0, 1.0)
+        empty = {name: values[:0] for name, values in empty.items()}
+        empty.update(position=np.zeros(0, dtype=np.int64), basis=np.zeros(0, dtype=np.int64))
+        self.empty = empty
+        self.pending = empty
+        self.vectors = empty
+        self.dy = np.zeros((3, 0))
+        self.first = 0
+        self.columns = np.zeros(0, dtype=np.int64)
+        self.modes = {}
+        self.fold_position = np.zeros(0, dtype=np.int64)
+        self.fold_N = np.zeros(0)
+        self.folded = []
+        self.frozen = {}
+
+    def inject(self, position, i, kcom):
+        """Pairs of mode i (0-based), injected with `kcom` at `position` of the batch."""
+        acc = self.pairs.supports(i, kcom)
+        if not len(acc["lo"]):
+            return
+        acc["position"] = np.full(len(acc["lo"]), position)
+        acc["basis"] = np.full(len(acc["lo"]), -1)
+        self.modes[position] = (i, kcom)
+        pending = concat_vectors(self.pending, acc)
+        self.pending = take_vectors(pending, np.argsort(pending["lo"], kind="stable"))
+        self.fold_position = np.append(self.fold_position, position)
+        self.fold_N = np.append(self.fold_N, acc["hi"].max())
+
+    def activate(self, first, N_hi):
+        """Start the vectors of the windows that open before N_hi; columns of the batch from `first`."""
+        n = np.searchsorted(self.pending["lo"], N_hi, side="right")
+        if n:
+            self.vectors = concat_vectors(self.vectors, take_vectors(self.pending, slice(0, n)))
+            self.pending = take_vectors(self.pending, slice(n, None))
+            self.dy = np.concatenate([self.dy, np.zeros((3, n))], axis=1)
+        self.first = first
+        self.columns = self.vectors["position"] - first
+
+    def fold(self, back, pert):
+        """
+        After a step to `back`: basis solutions for the modes whose windows
+        have all closed, and frozen basis solutions of the super-horizon modes
+        (`pert`: the batch of modes from `first`).
+        """
+        done = self.fold_N < back[3]
+        if done.any():
+            positions = self.fold_position[done]
+            self.fold_position, self.fold_N = self.fold_position[~done], self.fold_N[~done]
+
+            mine = np.isin(self.vectors["position"], positions)
+            self.folded.append((self.vectors["position"][mine], self.vectors["accident"][mine], self.dy[:, mine]))
+            self.vectors, self.dy = take_vectors(self.vectors, ~mine), self.dy[:, ~mine]
+
+            # Three basis solutions per mode (no source: empty support)
+            n = 3 * len(positions)
+            basis = {name: np.zeros(n, dtype=values.dtype) for name, values in self.empty.items()}
+            kcom = np.array([self.modes[p][1] for p in positions])
+            basis.update(position=np.repeat(positions, 3), basis=np.tile(np.arange(3), len(positions)),
+                         lo=np.full(n, np.inf), hi=np.full(n, -np.inf), kcom=np.repeat(kcom, 3))
+            self.vectors = concat_vectors(self.vectors, basis)
+            self.dy = np.concatenate([self.dy, np.tile(np.eye(3), len(positions))], axis=1)
+
+        if self.freeze_kaH > 0.0:
+            frozen = (self.vectors["basis"] >= 0) & (self.vectors["kcom"] * np.exp(-back[3]) / back[2] < self.freeze_kaH)
+            if frozen.any():
+                for p, b, dL in zip(self.vectors["position"][frozen], self.vectors["basis"][frozen], self.dy[0, frozen]):
+                    self.frozen.setdefault(p, np.zeros(3))[b] = dL / pert[0, p - self.first]
+                self.vectors, self.dy = take_vectors(self.vectors, ~frozen), self.dy[:, ~frozen]
+                self.columns = self.vectors["position"] - self.first
+
+    def stage_sources(self, stages):
+        """Unit sources of the vectors at the background stages `stages` (4 × stages)."""
+        source = np.zeros((stages.shape[1], self.dy.shape[1]))
+        v = self.vectors
+        active = (v["lo"] <= stages[3].max()) & (v["hi"] >= stages[3].min())
+        if active.any():
+            batch = take_vectors(v, active)
+            batch["mode"] = np.arange(active.sum())
+            source[:, active] = self.equations.source(stages, np.empty(active.sum()), batch)
+        return source
+
+    def finish(self, pert):
+        """d L_k / d a of the modes ending now (`pert`: the batch from `first`), into `response`."""
+        v = self.vectors
+        pair = v["basis"] < 0
+        modes = np.array([self.modes[p][0] for p in v["position"]], dtype=np.int64)
+        np.add.at(self.response, (modes[pair], v["accident"][pair]), self.dy[0, pair])
+
+        # L_k of the basis solutions at the end, by position
+        basis_L = {p: dL * pert[0, p - self.first] for p, dL in self.frozen.items()}
+        for p, b, dL in zip(v["position"][~pair], v["basis"][~pair], self.dy[0, ~pair]):
+            basis_L.setdefault(p, np.zeros(3))[b] = dL
+        for positions, accidents, dy in self.folded:
+            if not len(positions):
+                continue
+            L_end = np.array([basis_L[p] for p in positions])
+            modes = np.array([self.modes[p][0] for p in positions], dtype=np.int64)
+            np.add.at(self.response, (modes, accidents), np.einsum("nb,bn->n", L_end, dy))
+        self.reset()
+
+
+# ============================================================
+# Kernel
+# ============================================================
+
+def tile_rows(tiles):
+    """Accidents (ACCIDENT_DTYPE array or list of 6-tuples) as an n × 6 array."""
+    table = accident_table(tiles)
+    return np.column_stack([table[name] for name in ACCIDENT_FIELDS]).reshape(-1, 6)
+
+
+def kernel_tag(params, rows, freeze_kaH):
+    """`Kernel_<hash>`: the hash covers the background, `RESPONSE_KEYS`, freeze_kaH and the geometry of the tiles."""
+    digest = hashlib.sha1(f"freeze_kaH={freeze_kaH!r};".encode())
+    for key in BACKGROUND_KEYS["single"] + RESPONSE_KEYS:
+        digest.update(f"{key}={params.get(key)!r};".encode())
+    digest.update(np.ascontiguousarray(rows[:, 1:]).tobytes())
+    return f"Kernel_{digest.hexdigest()[:12]}"
+
+
+def response_kernel(mode, param_sets, tiles, freeze_kaH=1.0e-3, filename=None, recompute=False):
+    """
+    Kernel d zeta / d a of every mode 1..fortran_N_mod to every tile of `tiles`
+    (ACCIDENT_DTYPE array or list of 6-tuples; kgamma is not used), around the
+    accident-free evolution of the case of `param_sets`, with its
+    fortran_mod_accident. The tiles should be the basis of the environments
+    to evaluate, i.e. not merged (merge_tolerance=None): merged rectangles
+    depend on the kgamma of each environment. The linearized perturbations
+    of a mode stop once k/(aH) < freeze_kaH, where d L_k / L_k no longer
+    changes (0: up to the end of inflation).
+
+    The kernel is stored in `filename` (default MODE_FOLDERS[mode] /
+    response_cache / Kernel_<hash>.npz) and reused unless `recompute`.
+    Returns the path of the kernel.
+    """
+    if mode != "single":
+        raise ValueError(f"Unknown mode '{mode}' for the linear response (only 'single').")
+
+    params = param_sets[0]
+    rows = tile_rows(tiles)
+    if filename is None:
+        folder = os.path.join(MODE_FOLDERS[mode], RESPONSE_FOLDER)
+        os.makedirs(folder, exist_ok=True)
+        filename = os.path.join(folder, f"{kernel_tag(params, rows, freeze_kaH)}.npz")
+    if os.path.exists(filename) and not recompute:
+        print(f"♻️ Reusing response kernel: {filename}")
+        return filename
+
+    start_time = time.time()
+    equations = SingleFieldEquations(params)
+    N_ref = injection_points(params)
+    tangent = TangentLinear(equations, N_ref, rows, freeze_kaH)
+    result = evolve_modes(equations, params, AccidentPairs(equations, N_ref, np.zeros((0, 6))),
+                          ellipse=False, tangent=tangent)
+
+    # zeta = kcom³ L_k² / (2π² z²) → d zeta / d a = 2 zeta (d L_k / d a) / L_k
+    columns = OUTPUT_COLUMNS[mode]["power_spectrum"]
+    baseline = LazyData(dict(zip(columns, result["power_spectrum"].T)), mode)
+    kernel = 2.0 * (baseline["zeta"] / baseline["L"])[:, None] * tangent.response
+
+    np.savez_compressed(
+        filename,
+        kernel=kernel,
+        tiles=rows,
+        columns=np.array(columns),
+        power_spectrum=result["power_spectrum"],
+        params=json.dumps(params),
+    )
+    print(f"✅ Response kernel: {len(N_ref)} modes × {len(rows)} tiles "
+          f"({np.count_nonzero(kernel)} pairs) in {time.time() - start_time:.1f} s")
+    print(f"📄 Kernel written to {filename}")
+    return filename
+
+
+def read_kernel(filename):
+    """Contents of a kernel written by `response_kernel`."""
+    with np.load(filename) as data:
+        return {
+            "kernel": data["kernel"],
+            "tiles": data["tiles"],
+            "power_spectrum": dict(zip((str(c) for c in data["columns"]), data["power_spectrum"].T)),
+            "params": json.loads(str(data["params"])),
+        }
+
+
+# ============================================================
+# Environments
+# ============================================================
+
+def tile_amplitudes(kernel, accidents):
+    """
+    Amplitude a = sign(kgamma) kgamma² of every tile of the kernel for the
+    accidents of an environment, which must lie on the tiles (same p, N_star,
+    delta_star, loglE, delta_loglE); accidents on the same tile add up.
+    """
+    rows = tile_rows(accidents)
+    tiles = {tuple(np.round(tile[1:], 10)): k for k, tile in enumerate(kernel["tiles"])}
+    index = np.array([tiles.get(tuple(np.round(row[1:], 10)), -1) for row in rows], dtype=np.int64)
+    if (index < 0).any():
+        raise ValueError(f"{np.count_nonzero(index < 0)} accidents are not on the tiles of the kernel.")
+
+    amplitude = np.zeros(len(kernel["tiles"]))
+    np.add.at(amplitude, index, np.sign(rows[:, 0]) * rows[:, 0] * rows[:, 0])
+    return amplitude
+
+
+def linear_spectrum(kernel, accidents, threshold=0.1, fallback=True):
+    """
+    Power spectrum of an environment (accidents on the tiles of `kernel`, a
+    path or the dict of `read_kernel`) from the linear response:
+
+        zeta = zeta_0 + K @ a,    error ≈ (|K| @ |a|)² / zeta_0
+
+    where `error` is a conservative scale of the neglected second-order term
+    (it assumes the contributions of all the tiles add up). A tile is
+    nonlinear when the relative change it alone causes in some mode,
+    |a| max |K| / zeta_0, exceeds `threshold`; with `fallback`, the modes it
+    touches are integrated in full with the NumPy engine (every accident of
+    the environment) and their rows replace the linear estimate.
+
+    Returns a dict: "power_spectrum" (LazyData of the case-0 columns, with the
+    rows of the integrated modes and `zeta` set), "zeta_linear", "error" (0 for
+    the integrated modes), "fallback_modes" (0-based) and "nonlinear_tiles".
+    """
+    if not isinstance(kernel, dict):
+        kernel = read_kernel(kernel)
+
+    K = kernel["kernel"]
+    amplitude = tile_amplitudes(kernel, accidents)
+    columns = {name: values.copy() for name, values in kernel["power_spectrum"].items()}
+    zeta_0 = LazyData(kernel["power_spectrum"], "single")["zeta"]
+
+    zeta_linear = zeta_0 + K @ amplitude
+    error = (np.abs(K) @ np.abs(amplitude)) ** 2 / zeta_0
+
+    relative = np.abs(amplitude) * np.max(np.abs(K) / zeta_0[:, None], axis=0, initial=0.0)
+    nonlinear_tiles = np.flatnonzero(relative > threshold)
+    fallback_modes = np.flatnonzero(np.any(K[:, nonlinear_tiles] != 0.0, axis=1)) if fallback else np.zeros(0, dtype=np.int64)
+
+    zeta = zeta_linear.copy()
+    if len(fallback_modes):
+        print(f"🔁 {len(nonlinear_tiles)} nonlinear tiles: integrating {len(fallback_modes)} modes in full")
+        params = kernel["params"]
+        equations = SingleFieldEquations(params)
+        rows = tile_rows(accidents)
+        result = evolve_modes(equations, params, AccidentPairs(equations, injection_points(params), rows),
+                              modes=fallback_modes, ellipse=False)
+        for k, name in enumerate(OUTPUT_COLUMNS["single"]["power_spectrum"]):
+            columns[name][fallback_modes] = result["power_spectrum"][:, k]
+        zeta[fallback_modes] = LazyData(
+            dict(zip(OUTPUT_COLUMNS["single"]["power_spectrum"], result["power_spectrum"].T)), "single"
+        )["zeta"]
+        error[fallback_modes] = 0.0
+
+    power = LazyData(columns, "single")
+    power["zeta"] = zeta
+    return {
+        "power_spectrum": power,
+        "zeta_linear": zeta_linear,
+        "error": error,
+        "fallback_modes": fallback_modes,
+        "nonlinear_tiles": nonlinear_tiles,
+    }
@@ -1,70 +1,239 @@
 # modules_py/load_data.py
 import os
+from collections import OrderedDict
+from collections.abc import Mapping, MutableMapping
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 import numpy as np
 from modules_py.architecture import MODE_FOLDERS
+from modules_py.output_format import OUTPUT_COLUMNS, output_kind, read_archive, read_output
+from modules_py.partition import read_mode_timings
+
+# ============================================================
+# Derived quantities
+# name: (quantities it depends on, function of the data mapping)
+# ============================================================
+
+DERIVED = {
+    "single": {
+        'kvar': (('kcom', 'N', 'Hubble'),
+                 lambda d: d['kcom'] / (np.exp(d['N']) * d['Hubble'])),
+        'zeta': (('kcom', 'L', 'z'),
+                 lambda d: d['kcom']**3 * d['L']**2 / (2*np.pi**2 * d['z']**2)),
+        'gammavv': (('kcom', 'L'),
+                    lambda d: 2.0 * d['kcom'] * d['L']**2),
+        'gammavp': (('L', 'Lp'),
+                    lambda d: 2.0 * d['L'] * d['Lp']),
+        'gammapp': (('Lp', 'L', 'Tp', 'kcom'),
+                    lambda d: 2.0 * (d['Lp']**2 + d['L']**2 * d['Tp']**2) / d['kcom']),
+        'Determinant': (('L', 'Tp'),
+                        lambda d: 4.0 * d['L']**4 * d['Tp']**2),
+        'r': (('kcom', 'Tp', 'Lp', 'L'),
+              lambda d: 0.5 * np.arccosh(0.5*(d['kcom']**2 + d['Tp']**2 + (d['Lp']/d['L'])**2)/(d['kcom']*d['Tp']))),
+        'varphi': (('kcom', 'Lp', 'L', 'Tp'),
+                   lambda d: 0.5*np.arctan2(2.0*d['kcom']*(d['Lp']/d['L']), d['kcom']**2 - d['Tp']**2 - (d['Lp']/d['L'])**2) - np.pi/2),
+        'Omega': (('kcom', 'zpp_z'),
+                  lambda d: d['kcom']**2 - d['zpp_z']),
+    },
+    "two_field": {
+        'kvar': (('kcom', 'N', 'Hubble'),
+                 lambda d: d['kcom'] / (np.exp(d['N']) * d['Hubble'])),
+        'zeta': (('kcom', 'Hubble', 'N', 'phi_1_dot', 'phi_2_dot', 'L_11', 'L_21', 'L_22'),
+                 lambda d: (d['kcom']**3 / (4*np.pi**2)) * (d['Hubble']**2 / (np.exp(2.0*d['N']) * (d['phi_1_dot']**2 + d['phi_2_dot']**2)**2)) * (
+                     d['phi_1_dot']**2 * d['L_11']**2 + d['phi_2_dot']**2 * (d['L_21']**2 + d['L_22']**2) + 
+                     2.0 * d['phi_1_dot'] * d['phi_2_dot'] * d['L_11'] * d['L_21']
+                 )),
+        'gammavv_11': (('kcom', 'L_11'),
+                       lambda d: 2.0 * d['kcom'] * d['L_11']**2),
+        'gammavv_12': (('kcom', 'L_11', 'L_21'),
+                       lambda d: 2.0 * d['kcom'] * d['L_11'] * d['L_21']),
+        'gammavv_22': (('kcom', 'L_21', 'L_22'),
+                       lambda d: 2.0 * d['kcom'] * (d['L_21']**2 + d['L_22']**2)),
+        'gammavp_11': (('L_11', 'Lp_11'),
+                       lambda d: 2.0 * d['L_11'] * d['Lp_11']),
+        'gammavp_12': (('L_11', 'Lp_21', 'L_22', 'Y_12'),
+                       lambda d: 2.0 * d['L_11'] * (d['Lp_21'] - d['L_22'] * d['Y_12'])),
+        'gammavp_21': (('Lp_11', 'L_21', 'L_11', 'L_22', 'Y_12'),
+                       lambda d: 2.0 * d['Lp_11'] * d['L_21'] + 2.0 * d['L_11'] * d['L_22'] * d['Y_12']),
+        'gammavp_22': (('L_21', 'Lp_21', 'L_22', 'Lp_22'),
+                       lambda d: 2.0 * d['L_21'] * d['Lp_21'] + 2.0 * d['L_22'] * d['Lp_22']),
+        'gammapp_11': (('Lp_11', 'L_11', 'Y_12', 'Z_11', 'kcom'),
+                       lambda d: 2.0 * (d['Lp_11']**2 + d['L_11']**2 * (d['Y_12']**2 + d['Z_11'])) / d['kcom']),
+        'gammapp_12': (('Lp_11', 'Lp_21', 'L_11', 'L_21', 'L_22', 'Lp_22', 'Y_12', 'Z_11', 'Z_12', 'kcom'),
+                       lambda d: 2.0 * (d['Lp_11'] * d['Lp_21'] + d['L_11'] * d['L_21'] * (d['Y_12']**2 + d['Z_11']) + 
+                                        d['L_11'] * d['L_22'] * d['Z_12'] + d['Y_12'] * (d['L_11'] * d['Lp_22'] - d['Lp_11'] * d['L_22'])) / d['kcom']),
+        'gammapp_22': (('Lp_21', 'Lp_22', 'L_21', 'L_22', 'Y_12', 'Z_11', 'Z_12', 'Z_22', 'kcom'),
+                       lambda d: 2.0 * (d['Lp_21']**2 + d['Lp_22']**2 + d['L_21']**2 * (d['Y_12']**2 + d['Z_11']) + 
+                                        d['L_22']**2 * (d['Y_12']**2 + d['Z_22']) + 2.0 * d['L_21'] * d['L_22'] * d['Z_12'] + 
+                                        2.0 * d['Y_12'] * (d['L_21'] * d['Lp_22'] - d['L_22'] * d['Lp_21'])) / d['kcom']),
+        'Determinant': (('L_11', 'L_22', 'Z_11', 'Z_22', 'Z_12'),
+                        lambda d: 16.0 * d['L_11']**4 * d['L_22']**4 * (d['Z_11'] * d['Z_22'] - d['Z_12']**2)),
+    },
+}
+
+
+class LazyData(MutableMapping):
+    """
+    Dictionary of the quantities of one output file. The columns of the file
+    are stored as they are (views of the loaded array); the quantities of
+    `DERIVED[mode]` are computed on first access and cached.
+
+    Assigning or deleting a quantity drops the cached values that depend on it
+    (directly or through other derived quantities), so they are recomputed.
+    """
+
+    def __init__(self, columns, mode):
+        if mode not in DERIVED:
+            raise ValueError(f"Unknown mode '{mode}'.")
+
+        self._values = dict(columns)
+        self._derived = {}
+        self._cache = {}
+        # Only the quantities whose dependencies are available
+        for name, (deps, func) in DERIVED[mode].items():
+            if all(dep in self._values or dep in self._derived for dep in deps):
+                self._derived[name] = (deps, func)
+
+    def __getitem__(self, key):
+        if key in self._values:
+            return self._values[key]
+        if key in self._cache:
+            return self._cache[key]
+        if key not in self._derived:
+            raise KeyError(key)
+
+        value = self._derived[key][1](self)
+        self._cache[key] = value
+        return value
+
+    def __setitem__(self, key, value):
+        self._invalidate(key)
+        self._derived.pop(key, None)
+        self._values[key] = value
+
+    def __delitem__(self, key):
+        if key not in self:
+            raise KeyError(key)
+        self._invalidate(key)
+        self._values.pop(key, None)
+        self._derived.pop(key, None)
+
+    def __iter__(self):
+        yield from self._values
+        yield from (name for name in self._derived if name not in self._values)
+
+    def __len__(self):
+        return len(self._values) + sum(name not in self._values for name in self._derived)
+
+    def __contains__(self, key):
+        return key in self._values or key in self._derived
+
+    def __repr__(self):
+        return f"LazyData({len(self._values)} columns, {len(self._cache)}/{len(self._derived)} derived computed)"
+
+    def _invalidate(self, key):
+        """Drop the cached derived quantities that depend on `key`."""
+        self._cache.pop(key, None)
+        for name, (deps, _) in self._derived.items():
+            if key in deps and name in self._cache:
+                self._invalidate(name)
+
 
 def load_data(filename, mode):
     """
     It loads a data file and converts it into a dictionary of relevant quantities according to the simulation mode.
+
+    Text and binary files (`fortran_binary_output`) are accepted; the columns are named
+    after `OUTPUT_COLUMNS` (the header of a binary file), and binary columns are views
+    of the memory-mapped file. The result is a `LazyData`: the derived quantities
+    (`DERIVED[mode]`: kvar, zeta, gamma's, ...) are only computed when accessed.
     """
-    data = np.loadtxt(filename)
-    
-    if mode == "single":
-        dic = {
-            'phi': data[:,0], 'phi_dot': data[:,1], 'Hubble': data[:,2], 'N': data[:,3],
-            'L': data[:,4], 'Lp': data[:,5], 'Tp': data[:,6], 'epsilon': data[:,7],
-            'zpp_z': data[:,8], 'Vphi': data[:,9], 'Vdphi': data[:,10], 'Vddphi': data[:,11],
-            'kcom': data[:,12], 'kphys': data[:,13], 'z': data[:,14],
-            'Source': data[:,15], 'logL': data[:,16]
-        }
-        dic['kvar'] = dic['kcom'] / (np.exp(dic['N']) * dic['Hubble'])
-        dic['zeta'] = dic['kcom']**3 * dic['L']**2 / (2*np.pi**2 * dic['z']**2)
-        dic['gammavv'] = 2.0 * dic['kcom'] * dic['L']**2
-        dic['gammavp'] = 2.0 * dic['L'] * dic['Lp']
-        dic['gammapp'] = 2.0 * (dic['Lp']**2 + dic['L']**2 * dic['Tp']**2) / dic['kcom']
-        dic['Determinant'] = 4.0 * dic['L']**4 * dic['Tp']**2
-        dic['r'] = 0.5 * np.arccosh(0.5*(dic['kcom']**2 + dic['Tp']**2 + (dic['Lp']/dic['L'])**2)/(dic['kcom']*dic['Tp']))
-        dic['varphi'] = 0.5*np.arctan2(2.0*dic['kcom']*(dic['Lp']/dic['L']), dic['kcom']**2 - dic['Tp']**2 - (dic['Lp']/dic['L'])**2) - np.pi/2
-        dic['Omega'] = dic['kcom']**2 - dic['zpp_z']
-        
-    elif mode == "two_field":
-        dic = {
-            'phi_1': data[:,0], 'phi_2': data[:,1], 'phi_1_dot': data[:,2], 'phi_2_dot': data[:,3], 
-            'Hubble': data[:,4], 'N': data[:,5],
-            'L_11': data[:,6], 'L_12': data[:,7], 'L_21': data[:,8], 'L_22': data[:,9],
-            'Lp_11': data[:,10], 'Lp_12': data[:,11], 'Lp_21': data[:,12], 'Lp_22': data[:,13],
-            'Y_11': data[:,14], 'Y_12': data[:,15], 'Y_21': data[:,16], 'Y_22': data[:,17],
-            'Z_11': data[:,18], 'Z_12': data[:,19], 'Z_21': data[:,20], 'Z_22': data[:,21],
-            'epsilon': data[:,22], 'eta': data[:,23], 'Hf': data[:,24], 'kcom': data[:,25], 'kphys': data[:,26], 
-            'Vphi': data[:,27], 'Vdphi1': data[:,28], 'Vdphi2': data[:,29],
-            'Vdphi1dphi1': data[:,30], 'Vdphi1dphi2': data[:,31], 'Vdphi2dphi1': data[:,32], 'Vdphi2dphi2': data[:,33], 
-            'M_11': data[:,34], 'M_12': data[:,35], 'M_21': data[:,36], 'M_22': data[:,37], 
-            'Omega_11': data[:,38], 'Omega_12': data[:,39], 'Omega_21': data[:,40], 'Omega_22': data[:,41], 
-            'A_11': data[:,42], 'A_12': data[:,43], 'A_21': data[:,44], 'A_22': data[:,45],
-            'Decoherence_11': data[:,46], 'Decoherence_12': data[:,47], 'Decoherence_21': data[:,48], 'Decoherence_22': data[:,49], 
-            'logL': data[:,50], 'F': data[:,51],
-        }
-        dic['kvar'] = dic['kcom'] / (np.exp(dic['N']) * dic['Hubble'])
-        dic['zeta'] = (dic['kcom']**3 / (4*np.pi**2)) * (dic['Hubble']**2 / (np.exp(2.0*dic['N']) * (dic['phi_1_dot']**2 + dic['phi_2_dot']**2)**2)) * (
-            dic['phi_1_dot']**2 * dic['L_11']**2 + dic['phi_2_dot']**2 * (dic['L_21']**2 + dic['L_22']**2) + 
-            2.0 * dic['phi_1_dot'] * dic['phi_2_dot'] * dic['L_11'] * dic['L_21']
-        )
-        dic['gammavv_11'] = 2.0 * dic['kcom'] * dic['L_11']**2
-        dic['gammavv_12'] = 2.0 * dic['kcom'] * dic['L_11'] * dic['L_21']
-        dic['gammavv_22'] = 2.0 * dic['kcom'] * (dic['L_21']**2 + dic['L_22']**2)
-        dic['gammavp_11'] = 2.0 * dic['L_11'] * dic['Lp_11']
-        dic['gammavp_12'] = 2.0 * dic['L_11'] * (dic['Lp_21'] - dic['L_22'] * dic['Y_12'])
-        dic['gammavp_21'] = 2.0 * dic['Lp_11'] * dic['L_21'] + 2.0 * dic['L_11'] * dic['L_22'] * dic['Y_12']
-        dic['gammavp_22'] = 2.0 * dic['L_21'] * dic['Lp_21'] + 2.0 * dic['L_22'] * dic['Lp_22']
-        dic['gammapp_11'] = 2.0 * (dic['Lp_11']**2 + dic['L_11']**2 * (dic['Y_12']**2 + dic['Z_11'])) / dic['kcom']
-        dic['gammapp_12'] = 2.0 * (dic['Lp_11'] * dic['Lp_21'] + dic['L_11'] * dic['L_21'] * (dic['Y_12']**2 + dic['Z_11']) + 
-                                  dic['L_11'] * dic['L_22'] * dic['Z_12'] + dic['Y_12'] * (dic['L_11'] * dic['Lp_22'] - dic['Lp_11'] * dic['L_22'])) / dic['kcom']
-        dic['gammapp_22'] = 2.0 * (dic['Lp_21']**2 + dic['Lp_22']**2 + dic['L_21']**2 * (dic['Y_12']**2 + dic['Z_11']) + 
-                                  dic['L_22']**2 * (dic['Y_12']**2 + dic['Z_22']) + 2.0 * dic['L_21'] * dic['L_22'] * dic['Z_12'] + 
-                                  2.0 * dic['Y_12'] * (dic['L_21'] * dic['Lp_22'] - dic['L_22'] * dic['Lp_21'])) / dic['kcom']
-        dic['Determinant'] = 16.0 * dic['L_11']**4 * dic['L_22']**4 * (dic['Z_11'] * dic['Z_22'] - dic['Z_12']**2)
-    
-    return dic
+    return LazyData(read_columns(filename, mode), mode)
+
+
+def read_columns(filename, mode):
+    """
+    Columns of a data file as {name: 1D array} (views of the loaded array),
+    without derived quantities.
+    """
+    if mode not in OUTPUT_COLUMNS:
+        raise ValueError(f"Unknown mode '{mode}'.")
+
+    data, header = read_output(filename)
+    columns = header["columns"] if header is not None else OUTPUT_COLUMNS[mode][output_kind(filename)]
+    if data.size == 0:
+        data = np.empty((0, len(columns)))
+    if data.shape[1] != len(columns):
+        raise ValueError(f"{filename} has {data.shape[1]} columns, expected {len(columns)} for mode '{mode}'.")
+
+    return {name: data[:, k] for k, name in enumerate(columns)}
+
+
+class LazyEllipses(Mapping):
+    """
+    Ellipse files of a case, indexed by iteration number ({iter: path}).
+
+    A file is loaded with `load_data` the first time its entry is accessed and
+    at most `max_resident` of them are kept in memory (the least recently used
+    are dropped and reloaded on demand). Entries of missing files are None.
+    """
+
+    def __init__(self, paths, mode, max_resident=16):
+        self._paths = dict(paths)
+        self._mode = mode
+        self._loaded = OrderedDict()
+        self.max_resident = max_resident
+
+    def __getitem__(self, iter_val):
+        path = self._paths[iter_val]
+        if iter_val in self._loaded:
+            self._loaded.move_to_end(iter_val)
+            return self._loaded[iter_val]
+
+        data = load_data(path, self._mode) if os.path.exists(path) else None
+        self._store(iter_val, data)
+        return data
+
+    def __iter__(self):
+        return iter(self._paths)
+
+    def __len__(self):
+        return len(self._paths)
+
+    def __repr__(self):
+        return f"LazyEllipses({len(self._paths)} files, {len(self._loaded)} loaded)"
+
+    def _store(self, iter_val, data):
+        self._loaded[iter_val] = data
+        self._loaded.move_to_end(iter_val)
+        while len(self._loaded) > self.max_resident:
+            self._loaded.popitem(last=False)
+
+    def prefetch(self, iters=None, workers=None, processes=False):
+        """
+        Load the ellipses `iters` (all by default) in a pool of `workers`
+        threads, or processes if `processes` (the files are parsed in the
+        workers, the derived quantities stay lazy). `max_resident` is raised
+        if needed so that all of them stay in memory. Returns self.
+        """
+        iters = list(self._paths) if iters is None else list(iters)
+        self.max_resident = max(self.max_resident, len(iters))
+
+        pending = [i for i in iters if i not in self._loaded and os.path.exists(self._paths[i])]
+        for i in iters:
+            if i not in self._loaded and i not in pending:
+                self._store(i, None)
+
+        if processes:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                columns = pool.map(read_columns, [self._paths[i] for i in pending], [self._mode] * len(pending))
+                for i, cols in zip(pending, columns):
+                    self._store(i, LazyData(cols, self._mode))
+        else:
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                for i, data in zip(pending, pool.map(lambda i: load_data(self._paths[i], self._mode), pending)):
+                    self._store(i, data)
+
+        return self
 
 # Label dictionaries
 # Associates each stored quantity with its corresponding label for plotting.
@@ -176,15 +345,42 @@ def get_ylabel_dict(mode):
 
 
 
-def load_structure(mode, param_sets):    
+def power_iters(mode, mod_pref, N_mod, n_rows):
+    """
+    Iter of each row of a combined power spectrum without its case archive:
+    1..N_mod for a full spectrum, otherwise the modes recorded in the timing
+    files of the case (integrated modes of a non-uniform spectrum, in order).
+    """
+    if n_rows == N_mod:
+        return np.arange(1, N_mod + 1)
+
+    iters = np.array(sorted(read_mode_timings(mode, mod_pref)), dtype=int)
+    if len(iters) != n_rows:
+        raise ValueError(
+            f"Power spectrum of case {mod_pref} has {n_rows} rows for {N_mod} modes and its timing files "
+            f"list {len(iters)} modes: the iter of each row is unknown (run the case again to write its archive)."
+        )
+    return iters
+
+
+def load_structure(mode, param_sets, max_resident_ellipses=16):    
     """
     Loads and organizes the numerical output generated by the Fortran codes
     into the corresponding Evolution_XXX directory.
 
     Two data structures are constructed:
-      - Power spectrum (combined).
+      - Power spectrum (combined), from the case archive `Case_XXX.npz`
+        written by `run_simulation` if present (power spectrum and index of
+        the ellipse files), otherwise from `Power_Spectrum_PS_XXX.dat`.
+        `iters` holds the injected mode of each row: every mode 1..N_mod, or
+        the modes chosen by `adaptive_simulation` (non-uniform spectrum). Without
+        an up-to-date archive, the iters of a non-uniform spectrum are those of
+        the timing files of the case (ValueError if they do not match its rows).
       - Ellipses, indexed by iteration number,
-        if printing is enabled in the simulation.
+        if printing is enabled in the simulation. They are a `LazyEllipses`:
+        each file is read when accessed (at most `max_resident_ellipses` kept
+        in memory); `structure["ellipse"].prefetch(iters, workers=n)` reads
+        a batch in parallel.
     """
     if mode not in MODE_FOLDERS:
         raise ValueError(f"Unknown mode '{mode}'.")
@@ -211,27 +407,46 @@ def load_structure(mode, param_sets):
         power_filename = f"Power_Spectrum_PS_{mod_tag}.dat"
         power_path = os.path.join(folder, power_filename)
 
-        data_power = load_data(power_path, mode) if os.path.exists(power_path) else None
+        # Case archive written by run_simulation (unless the combined file is newer)
+        archive_path = os.path.join(folder, f"Case_{mod_tag}.npz")
+        archive = None
+        if os.path.exists(archive_path) and (
+            not os.path.exists(power_path) or os.path.getmtime(archive_path) >= os.path.getmtime(power_path)
+        ):
+            archive = read_archive(archive_path)
+
+        iters = None
+        if archive is not None:
+            data_power = LazyData(archive["power_spectrum"], mode)
+            iters = archive["power_iters"]
+        else:
+            data_power = load_data(power_path, mode) if os.path.exists(power_path) else None
+            if data_power is not None:
+                iters = power_iters(mode, mod_pref, N_mod, len(data_power["N"]))
         if data_power is None:
             print(f"⚠️   Could not load Power Spectrum (file missing or empty): {power_path}")
 
         # ------------------------------------------------------------------
         #  Ellipse
         # ------------------------------------------------------------------
-        ellipse = {}
+        ellipse_paths = {}
         
-        if use_ellipse:
+        if archive is not None:
+            ellipse_paths = {iter_val: os.path.join(folder, fname) for iter_val, (fname, _) in archive["ellipse"].items()}
+        elif use_ellipse:
             for iter_val in range(1, N_mod + 1):
                 if iter_val % res_elip == 0:
                     fname = f"Ellipse_P{mod_tag}_Iter_{iter_val:06d}.dat"
-                    fpath = os.path.join(folder, fname)
-                    ellipse[iter_val] = load_data(fpath, mode) if os.path.exists(fpath) else None
+                    ellipse_paths[iter_val] = os.path.join(folder, fname)
+
+        ellipse = LazyEllipses(ellipse_paths, mode, max_resident_ellipses)
 
         # Return final dict
         # --------------------
         return {
             "folder": folder,
             "power_spectrum": data_power,
+            "iters": iters,
             "ellipse": ellipse
         }
 
@@ -0,0 +1,601 @@
+# modules_py/numpy_engine.py
+import os
+import re
+import time
+import numpy as np
+from modules_py.architecture import MODE_FOLDERS, read_accident_table
+from modules_py.output_format import OUTPUT_COLUMNS, write_table
+from modules_py.run_fortran import write_case_archive
+
+"""
+Pure NumPy engine for the single-field mode: every injected mode of a case is
+evolved at the same time, without compiling anything.
+
+It integrates the same equations as the Fortran template (`evalf`, `zpp_over_z`),
+with the same 8th-order Gauss-Legendre stages, step (dt/0.05) and accident windows
+(`Hann_Taper_Center`, `Window_Ks`, `Window_Ns`, `Window_logLs`), and the potential
+is taken from the Fortran expressions of the profile (`fortran_Vphi`, ...).
+
+The background does not depend on the perturbations and every mode starts from
+the background walk at its injection point, so a single background is shared by
+all modes: at each step, the perturbations (L_k, L_k', theta_k') of the injected
+modes are advanced together as a (3, N_mod) array. The power spectrum and the
+ellipse files are written in the layout of the Fortran writers
+(`output_format.write_table`), so `load_data` and `load_structure` read them as usual.
+
+`evolve_modes` can also integrate a subset of the modes (the injection walk is
+the same, so their rows are those of the full run) and carry linearized
+perturbations along (`linear_response`).
+
+The Fortran-only optimizations (fortran_step_tol, fortran_wkb_kaH,
+fortran_freeze_kaH) are not used: the modes are integrated with the fixed step
+from the injection to the end of inflation. fortran_gl8_tol is honoured.
+"""
+
+# Butcher tableau of the 8th-order Gauss-Legendre method (as `a` and `b` in gl8, in the
+# column-major order of the template: the stages are updated with g = g @ GL8_A)
+GL8_A = np.array([
+    0.869637112843634643432659873054998518e-1, -0.266041800849987933133851304769531093e-1,
+    0.126274626894047245150568805746180936e-1, -0.355514968579568315691098184956958860e-2,
+    0.188118117499868071650685545087171160e0,   0.163036288715636535656734012694500148e0,
+    -0.278804286024708952241511064189974107e-1,  0.673550059453815551539866908570375889e-2,
+    0.167191921974188773171133305525295945e0,   0.353953006033743966537619131807997707e0,
+    0.163036288715636535656734012694500148e0,  -0.141906949311411429641535704761714564e-1,
+    0.177482572254522611843442956460569292e0,   0.313445114741868346798411144814382203e0,
+    0.352676757516271864626853155865953406e0,   0.869637112843634643432659873054998518e-1,
+]).reshape(4, 4, order="F")
+GL8_B = np.array([
+    0.173927422568726928686531974610999704e0, 0.326072577431273071313468025389000296e0,
+    0.326072577431273071313468025389000296e0, 0.173927422568726928686531974610999704e0,
+])
+
+TWOPI = 2.0 * np.pi
+TINY = np.finfo(np.float64).tiny
+
+# Fortran intrinsics allowed in the potential expressions
+FORTRAN_FUNCTIONS = {
+    "exp": np.exp, "log": np.log, "log10": np.log10, "sqrt": np.sqrt, "abs": np.abs,
+    "sin": np.sin, "cos": np.cos, "tan": np.tan, "sinh": np.sinh, "cosh": np.cosh,
+    "tanh": np.tanh, "atan": np.arctan, "asin": np.arcsin, "acos": np.arccos,
+}
+
+# Real literals with a d/q exponent (1.0d-14, 2.d0, 1Q0)
+FORTRAN_REAL = re.compile(r"\b(\d+\.?\d*|\.\d+)[dDqQ]([+-]?\d+)")
+
+
+def fortran_function(expression, name="expression"):
+    """
+    Function of phi from a Fortran expression of the profile (e.g. fortran_Vphi,
+    "1.0d-14 * phi*phi*phi*phi / 4.0"): d/q exponents become e, and the
+    intrinsics of `FORTRAN_FUNCTIONS` are evaluated with NumPy.
+    """
+    code = compile(FORTRAN_REAL.sub(r"\1e\2", expression.strip()).lower(), f"<{name}>", "eval")
+    unknown = set(code.co_names) - set(FORTRAN_FUNCTIONS) - {"phi"}
+    if unknown:
+        raise ValueError(f"Unsupported names in {name}: {', '.join(sorted(unknown))}.")
+
+    return lambda phi: eval(code, {"__builtins__": {}, **FORTRAN_FUNCTIONS}, {"phi": phi})
+
+
+def hann_taper_center(x, x_ref, x_delta, transition):
+    """Hann_Taper_Center of the template (transition = fortran_transition), elementwise."""
+    xm1 = x_ref - transition * x_delta
+    xm2 = x_ref + transition * x_delta
+    L = 2.0 * x_delta * (1.0 - transition)
+
+    rise = (x > x_ref - x_delta) & (x < xm1)
+    fall = (x > xm2) & (x < x_ref + x_delta)
+    # Hann_function(x - xm, L) = cos²(π (x - xm) / L) inside the ramps (none with transition = 1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        ramp = np.cos(np.pi * (x - np.where(rise, xm1, xm2)) / L) ** 2
+    inside = (x > x_ref - x_delta) & (x < x_ref + x_delta)
+    return np.where(inside & (x >= xm1) & (x <= xm2), 1.0, np.where(rise | fall, ramp, 0.0))
+
+
+# ============================================================
+# Equations of motion (evalf / zpp_over_z of the template)
+# ============================================================
+
+class SingleFieldEquations:
+    """
+    Right-hand side of the single-field system for a shared background (arrays
+    over the gl8 stages) and a batch of modes (kcom and their accidents).
+    """
+
+    def __init__(self, params):
+        self.Vphi = fortran_function(params["fortran_Vphi"], "fortran_Vphi")
+        self.Vprime = fortran_function(params["fortran_Vprime"], "fortran_Vprime")
+        self.Vprimeprime = fortran_function(params["fortran_Vprimeprime"], "fortran_Vprimeprime")
+        self.transition = float(params["fortran_transition"])
+        self.mod_accident = params["fortran_mod_accident"]
+        if self.mod_accident not in (0, 1):
+            raise ValueError("mod_accident must be 0, 1.")
+
+    def hubble(self, phi, phi_dot):
+        return np.sqrt(phi_dot * phi_dot / 6.0 + self.Vphi(phi) / 3.0)
+
+    @staticmethod
+    def epsilon(back):
+        return back[1] * back[1] / (2.0 * back[2] * back[2])
+
+    def zpp_over_z(self, back):
+        phi, phi_dot, Hubble, e_fold = back
+        Vpp = self.Vprimeprime(phi)
+        ddot_phi = -3.0 * Hubble * phi_dot - self.Vprime(phi)
+        epsilon1 = self.epsilon(back)
+        hubbp = -0.5 * phi_dot * phi_dot
+        tdot_phi = -3.0 * hubbp * phi_dot - 3.0 * Hubble * ddot_phi - Vpp * phi_dot
+        hubbpp = -phi_dot * ddot_phi
+        hubbppp = -(ddot_phi * ddot_phi) - phi_dot * tdot_phi
+        epsilon2 = hubbpp / (Hubble * hubbp) - 2.0 * hubbp / (Hubble * Hubble)
+        eps2dot = (hubbppp / (Hubble * hubbp)
+                   - (hubbpp * ((hubbp * hubbp) + hubbpp * Hubble)) / ((Hubble * hubbp) * (Hubble * hubbp))
+                   - 2.0 * hubbpp / (Hubble * Hubble) + 4.0 * (hubbp * hubbp) / (Hubble * Hubble * Hubble))
+        epsilon3 = eps2dot / (Hubble * epsilon2)
+
+        return np.exp(2.0 * e_fold) * (Hubble * Hubble) * (
+            2.0 - epsilon1 + 1.5 * epsilon2 + 0.25 * (epsilon2 * epsilon2)
+            - 0.5 * epsilon2 * epsilon1 + 0.5 * epsilon2 * epsilon3
+        )
+
+    def background(self, back):
+        """dphi/dt, dphidot/dt, dH/dt and d ln_a/dt (arrays over the stages)."""
+        phi, phi_dot, Hubble, _ = back
+        dydx = np.empty_like(back)
+        dydx[0] = phi_dot
+        dydx[1] = -3.0 * Hubble * phi_dot - self.Vprime(phi)
+        dydx[2] = -0.5 * phi_dot * phi_dot
+        dydx[3] = Hubble
+        return dydx
+
+    def source(self, back, kcom, accidents):
+        """
+        source_open at every stage (rows) for every mode of the batch (columns):
+        sum of Accident_Source over the accident pairs `accidents` (see `AccidentPairs.batch`).
+        """
+        N = back[3][None, :]
+        n_modes, n_stages = len(kcom), N.shape[1]
+        if accidents is None:
+            return np.zeros((n_stages, n_modes))
+
+        col = lambda name: accidents[name][:, None]
+        window = hann_taper_center(N - col("log_kcom"), col("loglE"), col("delta_loglE"), self.transition)
+        if self.mod_accident == 0:
+            # Window_Ks only depends on the injection point
+            window = window * col("window_k")
+        else:
+            window = window * hann_taper_center(N, col("N_star"), col("delta_star"), self.transition)
+
+        kgamma = col("kgamma")
+        amplitude = np.sign(kgamma) * kgamma * kgamma * col("kcom") * col("kcom") * np.exp((col("p") - 3.0) * N)
+        # Sum over the accidents of each mode
+        index = (col("mode") + n_modes * np.arange(n_stages)).ravel()
+        return np.bincount(index, weights=(window * amplitude).ravel(), minlength=n_stages * n_modes).reshape(n_stages, n_modes)
+
+    def stage_terms(self, back, kcom, accidents):
+        """
+        Factors of the perturbation equations that only depend on the background
+        stages `back` (4 × stages): 1/a, k² - z''/z and source/a (stages × modes).
+        """
+        inv_a = np.exp(-back[3])[:, None]
+        return {
+            "inv_a": inv_a,
+            "omega2": (kcom * kcom)[None, :] - self.zpp_over_z(back)[:, None],
+            "source": self.source(back, kcom, accidents) * inv_a,
+        }
+
+    @staticmethod
+    def perturbations(pert, terms):
+        """d L_k/dt, d L_k'/dt and d theta_k'/dt of the batch (3 × stages × modes)."""
+        L, Lp, Tp = pert
+        inv_a = terms["inv_a"]
+        dydx = np.empty_like(pert)
+        # d L_k/dt = L_k´/a
+        dydx[0] = Lp * inv_a
+        # d L_k'/dt = L_k''/a = -(k**2 - z''/z - theta_k_prime**2)*L_k/a
+        dydx[1] = -(terms["omega2"] - Tp * Tp) * L * inv_a
+        # d theta_k_prime/dt = -2 L'*theta_k_prime/L/a + source/(2*a*theta_prime*L_k**2)
+        dydx[2] = -2.0 * (Tp * Lp / L) * inv_a + terms["source"] / (2.0 * Tp * L * L)
+        return dydx
+
+    @staticmethod
+    def tangent(pert, dpert, terms):
+        """
+        Linearization of `perturbations` around `pert` (without accidents) applied
+        to `dpert` (3 × stages × vectors), plus the unit sources terms["source"].
+        """
+        L, Lp, Tp = pert
+        dL, dLp, dTp = dpert
+        inv_a = terms["inv_a"]
+        inv_L = 1.0 / L
+        lp = Lp * inv_L
+        dydx = np.empty_like(dpert)
+        dydx[0] = dLp * inv_a
+        dydx[1] = ((Tp * Tp - terms["omega2"]) * dL + 2.0 * Tp * L * dTp) * inv_a
+        dydx[2] = (-2.0 * inv_a) * (dTp * lp + Tp * inv_L * (dLp - lp * dL)) + terms["source"] * (0.5 * inv_L * inv_L / Tp)
+        return dydx
+
+
+# ============================================================
+# Accidents of the injected modes
+# ============================================================
+
+ACCIDENT_FIELDS = ("kgamma", "p", "N_star", "delta_star", "loglE", "delta_loglE")
+
+
+def case_accidents(mode, params):
+    """
+    Accident rows (n × 6, as add_accident) and number of accidents of each mode
+    of a case, from its runtime accident table (`intX_accidents.bin`, written by
+    make_split_incs); case 0 has none.
+    """
+    N_mod = params["fortran_N_mod"]
+    if params["fortran_mod_pref"] == 0:
+        return np.zeros((0, 6)), np.zeros(N_mod, dtype=np.int64)
+
+    table = read_accident_table(mode, params["fortran_mod_pref"])
+    if len(table["counts"]) != N_mod:
+        raise ValueError(
+            f"Accident table of case {params['fortran_mod_pref']} has "
+            f"{len(table['counts'])} modes, expected {N_mod}."
+        )
+    return table["table"], table["counts"]
+
+
+class AccidentPairs:
+    """
+    (mode, accident) pairs of the injected modes. `table` holds the accidents
+    (n × 6, as add_accident): with `counts`, the consecutive accidents of each
+    mode (runtime accident table, see `case_accidents`); without it, every
+    accident is tried on every mode, and kept if its window can still be
+    reached after the injection. The N-support of each window (as
+    `add_accident` in the template) is set when the mode is injected, once
+    kcom is known.
+
+    The modes are identified by their position in the batch of integrated
+    modes (columns of `pert`), and `batch` renumbers them from the first
+    active one.
+    """
+
+    def __init__(self, equations, N_ref, table, counts=None):
+        self.equations = equations
+        self.N_ref = N_ref
+        self.table = np.asarray(table, dtype=np.float64).reshape(-1, 6)
+        self.offsets = None if counts is None else np.concatenate([[0], np.cumsum(counts, dtype=np.int64)])
+        self.modes = {}
+        self.active = (None, None)
+
+    def supports(self, i, kcom):
+        """Accident pairs (dict of arrays) of mode i (0-based) injected with `kcom`."""
+        if self.offsets is None:
+            rows = np.arange(len(self.table))
+        else:
+            rows = np.arange(self.offsets[i], self.offsets[i + 1])
+        acc = dict(zip(ACCIDENT_FIELDS, self.table[rows].T))
+        log_kcom = np.log(kcom)
+
+        # Window_logLs: logL = N - log(kcom)
+        lo = acc["loglE"] - acc["delta_loglE"] + log_kcom
+        hi = acc["loglE"] + acc["delta_loglE"] + log_kcom
+        window_k = np.ones(len(rows))
+        if self.equations.mod_accident == 0:
+            # N accidents: the window only depends on the injection point
+            window_k = hann_taper_center(self.N_ref[i], acc["N_star"], acc["delta_star"], self.equations.transition)
+            hi = np.where(window_k == 0.0, -np.inf, hi)
+        else:
+            lo = np.maximum(lo, acc["N_star"] - acc["delta_star"])
+            hi = np.minimum(hi, acc["N_star"] + acc["delta_star"])
+
+        acc.update(
+            accident=rows, kcom=np.full(len(rows), kcom), log_kcom=np.full(len(rows), log_kcom),
+            window_k=window_k, lo=lo, hi=hi,
+        )
+        if self.offsets is None:
+            keep = (hi > lo) & (hi >= self.N_ref[i])
+            acc = {name: values[keep] for name, values in acc.items()}
+        return acc
+
+    def inject(self, position, i, kcom):
+        """Pairs of mode i (0-based), injected with `kcom` at `position` of the batch."""
+        acc = self.supports(i, kcom)
+        acc["position"] = np.full(len(acc["lo"]), position)
+        self.modes[position] = acc
+        self.active = (None, None)
+
+    def batch(self, first, last, N_lo, N_hi):
+        """
+        Pairs of the modes at positions first..last-1 whose support overlaps
+        [N_lo, N_hi], with the modes renumbered from 0 (`mode`), or None.
+        """
+        if self.active[0] != (first, last):
+            for position in [p for p in self.modes if p < first]:
+                del self.modes[position]
+            chunks = [self.modes[p] for p in range(first, last) if p in self.modes]
+            pairs = {name: np.concatenate([c[name] for c in chunks]) for name in chunks[0]} if chunks else None
+            self.active = ((first, last), pairs)
+
+        pairs = self.active[1]
+        if pairs is None:
+            return None
+        active = (pairs["lo"] <= N_hi) & (pairs["hi"] >= N_lo)
+        if not active.any():
+            return None
+        batch = {name: values[active] for name, values in pairs.items()}
+        batch["mode"] = batch["position"] - first
+        return batch
+
+
+# ============================================================
+# Integrator
+# ============================================================
+
+def gl8_step(equations, back, pert, h, kcom, accidents, sweeps=16, tol=0.0, guess=None, tangent=None):
+    """
+    One gl8 step of size h for the background `back` (4,) and the perturbations
+    `pert` (3 × modes: L_k, L_k', theta_k'), in place. The stages are iterated
+    as in the template: `sweeps` sweeps from zero stages, or, with tol > 0, at
+    most `sweeps` sweeps until the relative change of every stage is below tol,
+    starting from the stages of the previous step (`guess`, a dict updated in place).
+    Returns the number of sweeps.
+
+    The background stages do not depend on the perturbations, so they are
+    iterated first (once they reach their fixed point, or converge with tol > 0,
+    the remaining sweeps repeat them) and z''/z, 1/a and the sources of every
+    sweep are evaluated in a single call; the sweeps of the perturbations then
+    see the same stages as in the template.
+
+    `tangent` (see `linear_response.TangentLinear`) adds linearized perturbations
+    `tangent.dy` (3 × vectors) of the modes `tangent.columns`, driven by
+    `tangent.stage_sources(stages)`: they are iterated with the perturbations,
+    as extra components of the same system.
+    """
+    g_back, g_pert = np.zeros((4, 4)), np.zeros((3, 4, pert.shape[1]))
+    if tol > 0.0:
+        g_back = guess.get("back", g_back)
+        g_pert = guess.get("pert", g_pert)
+    if tangent is not None and not tangent.dy.shape[1]:
+        tangent = None
+
+    # converged: relative change of every stage below gl8_tol
+    def change(g, g_old, y):
+        return np.max(np.abs(g - g_old) * h / (np.abs(y) + np.abs(g) * h + TINY))
+
+    stages, g_backs, back_change = [], [], []
+    for sweep in range(sweeps):
+        stage = back[:, None] + (g_back @ GL8_A) * h
+        g_new = equations.background(stage)
+        fixed = np.array_equal(g_new, g_back)
+        back_change.append(change(g_new, g_back, back[:, None]) if tol > 0.0 else 0.0)
+        g_back = g_new
+        stages.append(stage)
+        g_backs.append(g_back)
+        if fixed or (tol > 0.0 and back_change[-1] <= tol):
+            break
+
+    n_sweeps = len(g_backs)
+    if pert.shape[1]:
+        terms = equations.stage_terms(np.concatenate(stages, axis=1), kcom, accidents)
+        if tangent is not None:
+            columns = tangent.columns
+            unit = tangent.stage_sources(np.concatenate(stages, axis=1)) * terms["inv_a"]
+            g_tan = np.zeros((3, 4, len(columns)))
+        for sweep in range(sweeps):
+            k = min(sweep, len(stages) - 1)
+            terms_k = {name: values[4 * k:4 * k + 4] for name, values in terms.items()}
+            # g = g @ GL8_A, with the stages along the second axis
+            stage = pert[:, None, :] + (GL8_A.T @ g_pert) * h
+            g_new = equations.perturbations(stage, terms_k)
+            pert_change = change(g_new, g_pert, pert[:, None, :]) if tol > 0.0 else 0.0
+            if tangent is not None:
+                tan_stage = tangent.dy[:, None, :] + (GL8_A.T @ g_tan) * h
+                tan_terms = {
+                    "inv_a": terms_k["inv_a"], "omega2": terms_k["omega2"][:, columns],
+                    "source": unit[4 * k:4 * k + 4],
+                }
+                g_tan_new = equations.tangent(stage[:, :, columns], tan_stage, tan_terms)
+                if tol > 0.0:
+                    pert_change = max(pert_change, change(g_tan_new, g_tan, tangent.dy[:, None, :]))
+                g_tan = g_tan_new
+            g_pert = g_new
+            if tol > 0.0 and max(pert_change, back_change[k]) <= tol:
+                break
+        n_sweeps = sweep + 1
+        g_back = g_backs[min(sweep, len(g_backs) - 1)]
+        if tangent is not None:
+            tangent.dy += (GL8_B @ g_tan) * h
+
+    if tol > 0.0:
+        guess["back"], guess["pert"] = g_back, g_pert
+
+    back += (g_back @ GL8_B) * h
+    pert += (GL8_B @ g_pert) * h
+    return n_sweeps
+
+
+def attractor_background(equations, back, N_end, sweeps=16, tol=0.0, dt=0.1, dN_max=1.0e-3):
+    """
+    Evolve the background `back` in place with steps of `dt` (0.1 in the template)
+    until N >= N_end. The template takes millions of such steps; here they are
+    grouped into gl8 steps of m*dt (up to dN_max e-folds each, far below the
+    scale of the background), on the same time grid, and only the last steps
+    before N_end are taken one by one, so the end point is the template's.
+    """
+    no_modes, no_kcom = np.zeros((3, 0)), np.zeros(0)
+    while True:
+        dN = back[2] * dt
+        m = max(1, int(min(dN_max, 0.5 * (N_end - back[3])) / dN))
+        gl8_step(equations, back, no_modes, m * dt, no_kcom, None, sweeps, tol, {})
+        if m == 1 and back[3] >= N_end:
+            break
+
+
+def output_rows(equations, kind, back, pert, kcom, kphys, accidents):
+    """Rows of a power spectrum or ellipse file for a batch of modes at the state `back`, `pert` (3 × modes)."""
+    n = len(kcom)
+    values = {
+        "phi": back[0], "phi_dot": back[1], "Hubble": back[2], "N": back[3],
+        "L": pert[0], "Lp": pert[1], "Tp": pert[2],
+        "epsilon": equations.epsilon(back), "zpp_z": equations.zpp_over_z(back),
+        "Vphi": equations.Vphi(back[0]), "Vdphi": equations.Vprime(back[0]),
+        "Vddphi": equations.Vprimeprime(back[0]),
+        "kcom": kcom, "kphys": kphys, "z": back[1] * np.exp(back[3]) / back[2],
+        "Source": equations.source(back[:, None], kcom, accidents)[0],
+        "logL": back[3] - np.log(kcom),
+    }
+    return np.column_stack([np.broadcast_to(values[name], (n,)) for name in OUTPUT_COLUMNS["single"][kind]])
+
+
+def injection_points(params):
+    """N_ref of the modes 1..fortran_N_mod: N_initial_inj + N_step*iter."""
+    return params["fortran_N_initial_inj"] + params["fortran_N_step"] * np.arange(1, params["fortran_N_mod"] + 1)
+
+
+def evolve_modes(equations, params, accidents, modes=None, ellipse=None, tangent=None):
+    """
+    Evolve the modes `modes` (0-based, sorted; all of them if None) of the case
+    of `params` together, with the accident pairs `accidents` (`AccidentPairs`).
+    The injection walk is the template's for every mode, so the modes that are
+    not integrated still take their step. With `ellipse` (fortran_ellipse if
+    None) the ellipse rows are stored every fortran_time_resolution steps of
+    the modes multiple of fortran_ellipse_resolution. `tangent` (see
+    `linear_response.TangentLinear`) is evolved along, and told about the
+    injections and the end of the modes.
+
+    Returns a dict: power spectrum rows (one per mode of `modes`), ellipse rows
+    {iter: rows}, number of steps and of sweeps.
+    """
+    N_mod = params["fortran_N_mod"]
+    N_ref = injection_points(params)
+    modes = np.arange(N_mod) if modes is None else np.asarray(modes, dtype=np.int64)
+    if ellipse is None:
+        ellipse = str(params["fortran_ellipse"]).strip().lower() in [".true."]
+    time_resolution = params["fortran_time_resolution"]
+    ellipse_resolution = params["fortran_ellipse_resolution"]
+    tol = float(params.get("fortran_gl8_tol", 0.0))
+    sweeps = params.get("fortran_gl8_max_sweeps", 64) if tol > 0.0 else 16
+
+    # 🔹 Background up to the attractor (end in N = fortran_N_initial_inj)
+    phi, phi_dot = float(params["initial_phi"]), float(params["initial_phi_dot"])
+    back = np.array([phi, phi_dot, equations.hubble(phi, phi_dot), float(params["initial_ln_a"])])
+    attractor_background(equations, back, params["fortran_N_initial_inj"], sweeps, tol)
+
+    # Setting up the kphys and timestep (dt / 0.05)
+    kphys = params["fortran_kphys"] * back[2]
+    h = TWOPI * (1.0 / kphys) / 60.0 / 0.05
+
+    # 🔹 Shared evolution up to the end of inflation (ε >= 1.0): the modes at
+    # positions first..injected-1 of `modes` are integrated together
+    n = len(modes)
+    kcom = np.zeros(n)
+    pert = np.zeros((3, n))
+    injected_at = np.zeros(n, dtype=np.int64)
+    power_rows = np.zeros((n, len(OUTPUT_COLUMNS["single"]["power_spectrum"])))
+    ellipse_rows = {}
+    first = injected = walk = steps = sweeps_total = 0
+    guess = {}
+
+    while first < n:
+        # Accidents whose window can be reached by the stages of this step
+        reach = back[2] * h
+        batch = accidents.batch(first, injected, back[3] - reach, back[3] + 2.0 * reach)
+        if tangent is not None:
+            tangent.activate(first, back[3] + 2.0 * reach)
+        active = pert[:, first:injected]
+        sweeps_total += gl8_step(equations, back, active, h, kcom[first:injected], batch, sweeps, tol, guess, tangent)
+        steps += 1
+        if tangent is not None:
+            tangent.fold(back, active)
+
+        # Store ellipse evolution every fortran_time_resolution steps of each mode
+        if ellipse and injected > first:
+            iters = modes[first:injected] + 1
+            j = steps - 1 - injected_at[first:injected]
+            store = np.flatnonzero((iters % ellipse_resolution == 0) & (j % time_resolution == 0))
+            if len(store):
+                rows = output_rows(equations, "ellipse", back, active, kcom[first:injected], kphys,
+                                   accidents.batch(first, injected, back[3], back[3]))
+                for k in store:
+                    ellipse_rows.setdefault(iters[k], []).append(rows[k])
+
+        # Exit when inflation ends (every mode integrated so far ends at this step)
+        if injected > first and equations.epsilon(back) >= 1.0:
+            power_rows[first:injected] = output_rows(
+                equations, "power_spectrum", back, active, kcom[first:injected], kphys,
+                accidents.batch(first, injected, back[3], back[3]),
+            )
+            if tangent is not None:
+                tangent.finish(active)
+            first = injected
+            guess.pop("pert", None)
+
+        # Injection of the next mode (as the background walk: at least one step after the previous one)
+        if walk < N_mod and back[3] >= N_ref[walk]:
+            if injected < n and modes[injected] == walk:
+                kcom[injected] = kphys * np.exp(back[3])
+                omega = np.sqrt(kcom[injected] ** 2 - equations.zpp_over_z(back))
+                # Set-up initial perturbations in Minkowski vacuum
+                pert[:, injected] = [1.0 / np.sqrt(2.0 * omega), 0.0, omega]
+                accidents.inject(injected, walk, kcom[injected])
+                if tangent is not None:
+                    tangent.inject(injected, walk, kcom[injected])
+                injected_at[injected] = steps
+                injected += 1
+                # The new mode starts from zero stages
+                if "pert" in guess:
+                    guess["pert"] = np.concatenate([guess["pert"], np.zeros((3, 4, 1))], axis=2)
+            walk += 1
+
+    return {"power_spectrum": power_rows, "ellipse": ellipse_rows, "steps": steps, "sweeps": sweeps_total}
+
+
+def run_numpy_engine(mode, param_sets, output_folder=None):
+    """
+    Evolve every injected mode of the case of `param_sets` at the same time with
+    the NumPy engine, and write what `run_simulation` would write: the combined
+    power spectrum, the ellipse files (fortran_ellipse = .true.) and the case
+    archive, in MODE_FOLDERS[mode] / Data_&_Codes_XXX / Evolution_XXX (or in
+    `output_folder`, e.g. to compare with the Fortran outputs).
+
+    The parts of `param_sets` are not used: all the modes 1..fortran_N_mod are
+    integrated. The accidents are read from the runtime accident table of the
+    case (`intX_accidents.bin`), so `make_split_incs` must have been run first
+    for cases > 0. Returns the path of the power spectrum.
+    """
+    if mode != "single":
+        raise ValueError(f"Unknown mode '{mode}' for the NumPy engine (only 'single').")
+
+    params = param_sets[0]
+    mod_tag = f"{params['fortran_mod_pref']:03d}"
+    if output_folder is None:
+        output_folder = os.path.join(MODE_FOLDERS[mode], f"Data_&_Codes_{mod_tag}", f"Evolution_{mod_tag}")
+    os.makedirs(output_folder, exist_ok=True)
+
+    for key in ("fortran_step_tol", "fortran_wkb_kaH", "fortran_freeze_kaH"):
+        if float(params.get(key, 0.0)) > 0.0:
+            print(f"⚠️  {key} is not used by the NumPy engine (fixed step from the injection)")
+
+    N_mod = params["fortran_N_mod"]
+    binary = str(params["fortran_binary_output"]).strip().lower() in [".true."]
+
+    start_time = time.time()
+    equations = SingleFieldEquations(params)
+    accidents = AccidentPairs(equations, injection_points(params), *case_accidents(mode, params))
+    result = evolve_modes(equations, params, accidents)
+
+    # ============================================================
+    # Outputs (same files as the Fortran codes)
+    # ============================================================
+    power_file = os.path.join(output_folder, f"Power_Spectrum_PS_{mod_tag}.dat")
+    write_table(power_file, mode, "power_spectrum", result["power_spectrum"], params["fortran_mod_pref"], binary)
+    for iter_val, rows in result["ellipse"].items():
+        write_table(
+            os.path.join(output_folder, f"Ellipse_P{mod_tag}_Iter_{iter_val:06d}.dat"),
+            mode, "ellipse", rows, params["fortran_mod_pref"], binary,
+        )
+    write_case_archive(mode, params, output_folder, power_file)
+
+    steps = result["steps"]
+    print(f"✅ NumPy engine: {N_mod} modes of case {mod_tag} in {time.time() - start_time:.1f} s "
+          f"({steps} steps, {result['sweeps'] / max(steps, 1):.1f} sweeps per step)")
+    print(f"📄 Power spectrum written to {power_file}")
+    return power_file
@@ -0,0 +1,259 @@
+# modules_py/output_format.py
+import os
+import struct
+import numpy as np
+
+"""
+Shared schema of the power spectrum and ellipse files written by the Fortran codes.
+
+`OUTPUT_COLUMNS[mode][kind]` lists the name of every column of a row, where `kind`
+is "power_spectrum" (one row per mode) or "ellipse" (rows along the evolution of a
+mode). The same lists are written into the templates (`fortran_*_columns`), so the
+Fortran writers, `load_data` and the merges of `run_simulation` agree on the layout.
+
+With `fortran_binary_output = .true.` the files are binary streams:
+
+    header: "NTILEBIN", real_bytes, nout, mod_pref (int32), mode, part (16 chars),
+            length of the column names (int32), column names separated by commas
+    rows:   nout reals of real_bytes bytes each (native byte order)
+
+and `read_output` maps the rows with `np.memmap`, so each column is a view of the
+file. Text files (`.false.`, DEFAULT) keep one row per line in ES24.16E3 format.
+
+The combined power spectrum of a case and the index of its ellipse files are also
+stored in a case archive (`write_archive` / `read_archive`, `Case_XXX.npz`).
+"""
+
+OUTPUT_COLUMNS = {
+    "single": {
+        "ellipse": [
+            "phi", "phi_dot", "Hubble", "N", "L", "Lp", "Tp", "epsilon",
+            "zpp_z", "Vphi", "Vdphi", "Vddphi", "kcom", "kphys", "z", "Source", "logL",
+        ],
+        # The final state of each mode stores z''/z after the potential
+        "power_spectrum": [
+            "phi", "phi_dot", "Hubble", "N", "L", "Lp", "Tp", "epsilon",
+            "Vphi", "Vdphi", "Vddphi", "zpp_z", "kcom", "kphys", "z", "Source", "logL",
+        ],
+    },
+    "two_field": {},
+}
+
+OUTPUT_COLUMNS["two_field"]["ellipse"] = (
+    ["phi_1", "phi_2", "phi_1_dot", "phi_2_dot", "Hubble", "N"]
+    + [f"{name}_{ij}" for name in ("L", "Lp", "Y", "Z") for ij in ("11", "12", "21", "22")]
+    + ["epsilon", "eta", "Hf", "kcom", "kphys", "Vphi", "Vdphi1", "Vdphi2",
+       "Vdphi1dphi1", "Vdphi1dphi2", "Vdphi2dphi1", "Vdphi2dphi2"]
+    + [f"{name}_{ij}" for name in ("M", "Omega", "A", "Decoherence") for ij in ("11", "12", "21", "22")]
+    + ["logL", "F"]
+)
+OUTPUT_COLUMNS["two_field"]["power_spectrum"] = OUTPUT_COLUMNS["two_field"]["ellipse"]
+
+BINARY_MAGIC = b"NTILEBIN"
+# magic, real_bytes, nout, mod_pref, mode, part, length of the column names
+HEADER_STRUCT = struct.Struct("=8s3i16s16si")
+
+
+def output_kind(filename):
+    """'power_spectrum' for the Power_Spectrum_* files, 'ellipse' otherwise."""
+    return "power_spectrum" if os.path.basename(filename).startswith("Power_Spectrum") else "ellipse"
+
+
+def template_columns(mode):
+    """
+    Placeholders with the column names of each kind of file, injected into the
+    templates by `generate_fortran_files`.
+    """
+    if mode not in OUTPUT_COLUMNS:
+        raise ValueError(f"Unknown mode '{mode}'.")
+
+    return {
+        f"fortran_{kind}_columns": ",".join(columns)
+        for kind, columns in OUTPUT_COLUMNS[mode].items()
+    }
+
+
+def binary_header(mode, mod_pref, part, columns, real_bytes=8):
+    """Bytes of the header of a binary output file (same layout as the Fortran writer)."""
+    names = ",".join(columns).encode()
+    return HEADER_STRUCT.pack(
+        BINARY_MAGIC, real_bytes, len(columns), mod_pref,
+        mode.encode().ljust(16), str(part).encode().ljust(16), len(names)
+    ) + names
+
+
+def read_header(filename):
+    """
+    Header of a binary output file as a dict (mode, mod_pref, part, nout,
+    real_bytes, columns, offset of the first row), or None for a text file.
+    """
+    with open(filename, "rb") as f:
+        head = f.read(HEADER_STRUCT.size)
+        if len(head) < HEADER_STRUCT.size or not head.startswith(BINARY_MAGIC):
+            return None
+        _, real_bytes, nout, mod_pref, mode, part, n_names = HEADER_STRUCT.unpack(head)
+        columns = f.read(n_names).decode().split(",")
+
+    if len(columns) != nout:
+        raise ValueError(f"Corrupted header in {filename}: {len(columns)} column names, nout = {nout}.")
+
+    return {
+        "mode": mode.decode().strip(),
+        "mod_pref": mod_pref,
+        "part": part.decode().strip(),
+        "nout": nout,
+        "real_bytes": real_bytes,
+        "columns": columns,
+        "offset": HEADER_STRUCT.size + n_names,
+    }
+
+
+def read_output(filename):
+    """
+    Rows of an output file as a 2D array, and its header (None for text files).
+    Binary rows are mapped with `np.memmap` (read-only), so column slices
+    `data[:, k]` are views of the file and nothing is parsed.
+    """
+    header = read_header(filename)
+    if header is None:
+        if os.path.getsize(filename) == 0:
+            return np.empty((0, 0)), None
+        return np.atleast_2d(np.loadtxt(filename)), None
+
+    dtype = np.dtype(f"f{header['real_bytes']}")
+    row_bytes = header["nout"] * dtype.itemsize
+    n_rows = (os.path.getsize(filename) - header["offset"]) // row_bytes
+    if n_rows == 0:
+        return np.empty((0, header["nout"]), dtype=dtype), header
+
+    data = np.memmap(filename, dtype=dtype, mode="r", offset=header["offset"], shape=(n_rows, header["nout"]))
+    return data, header
+
+
+def iter_rows(filename, chunk_rows=4096):
+    """
+    Rows of an output file as raw records, one at a time: the lines of a text
+    file, or the bytes of each row of a binary file (read `chunk_rows` rows at
+    a time). Used to merge part, per-mode and case-0 files without parsing them.
+    """
+    header = read_header(filename)
+    if header is None:
+        with open(filename) as f:
+            yield from f
+        return
+
+    row_bytes = header["nout"] * header["real_bytes"]
+    with open(filename, "rb") as f:
+        f.seek(header["offset"])
+        while True:
+            chunk = f.read(row_bytes * chunk_rows)
+            if not chunk:
+                break
+            for i in range(0, len(chunk) - row_bytes + 1, row_bytes):
+                yield chunk[i:i + row_bytes]
+
+
+def count_rows(filename):
+    """Number of rows of an output file (without reading a binary one)."""
+    header = read_header(filename)
+    if header is None:
+        with open(filename, "rb") as f:
+            return sum(1 for line in f if line.strip())
+    return (os.path.getsize(filename) - header["offset"]) // (header["nout"] * header["real_bytes"])
+
+
+def write_rows(filename, header, rows, part="Complete"):
+    """
+    Write raw records taken from `iter_rows` into `filename`: a text file if
+    `header` is None, otherwise a binary file whose header is `header` with
+    the given `part`.
+    """
+    if header is None:
+        with open(filename, "w") as f:
+            f.writelines(rows)
+        return
+
+    with open(filename, "wb") as f:
+        f.write(binary_header(header["mode"], header["mod_pref"], part, header["columns"], header["real_bytes"]))
+        f.writelines(rows)
+
+
+def fortran_es(value):
+    """`value` in the ES24.16E3 edit descriptor of the Fortran text writers."""
+    if not np.isfinite(value):
+        return f"{'NaN' if np.isnan(value) else ('-' if value < 0 else '') + 'Infinity':>24}"
+    mantissa, exponent = f"{value:.16E}".split("E")
+    return f"{mantissa}E{int(exponent):+04d}".rjust(24)
+
+
+def write_table(filename, mode, kind, rows, mod_pref, binary=False, part="Complete"):
+    """
+    Write a 2D array of rows (columns in the order of `OUTPUT_COLUMNS[mode][kind]`)
+    in the layout of the Fortran writers: ES24.16E3 text rows, or a binary file
+    with its header. Used by the Python engines (`numpy_engine`).
+    """
+    columns = OUTPUT_COLUMNS[mode][kind]
+    rows = np.asarray(rows, dtype=np.float64).reshape(-1, len(columns))
+
+    if not binary:
+        with open(filename, "w") as f:
+            f.writelines("".join(fortran_es(x) + " " for x in row) + "\n" for row in rows)
+        return
+
+    with open(filename, "wb") as f:
+        f.write(binary_header(mode, mod_pref, part, columns))
+        f.write(np.ascontiguousarray(rows).tobytes())
+
+
+# ============================================================
+# Case archive
+# ============================================================
+
+def write_archive(filename, mode, mod_pref, power_file, ellipse_files, power_iters=None):
+    """
+    Consolidated archive of a case (`.npz`): the rows of the combined power
+    spectrum with their column names and the injected mode (iter) of each row
+    (`power_iters`, default 1..number of rows; a subset of the modes for a
+    non-uniform spectrum), and the index of the ellipse files {iter: path}
+    (iteration, file name and number of rows of each one).
+    """
+    data, header = read_output(power_file)
+    columns = header["columns"] if header is not None else OUTPUT_COLUMNS[mode]["power_spectrum"]
+    power = np.asarray(data).reshape(-1, len(columns))
+    if power_iters is None:
+        power_iters = np.arange(1, len(power) + 1)
+    if len(power_iters) != len(power):
+        raise ValueError(f"{power_file} has {len(power)} rows, expected {len(power_iters)} modes.")
+    iters = sorted(ellipse_files)
+
+    np.savez(
+        filename,
+        mode=mode,
+        mod_pref=mod_pref,
+        columns=np.array(columns),
+        power_spectrum=power,
+        power_iter=np.array(power_iters, dtype=int),
+        ellipse_iter=np.array(iters, dtype=int),
+        ellipse_file=np.array([os.path.basename(ellipse_files[i]) for i in iters], dtype=str),
+        ellipse_rows=np.array([count_rows(ellipse_files[i]) for i in iters], dtype=int),
+    )
+
+
+def read_archive(filename):
+    """
+    Contents of a case archive written by `write_archive`: mode, mod_pref,
+    the power spectrum columns {name: array}, the iter of each of its rows
+    and the ellipse index {iter: (file name, number of rows)}.
+    """
+    with np.load(filename) as archive:
+        power = archive["power_spectrum"]
+        return {
+            "mode": str(archive["mode"]),
+            "mod_pref": int(archive["mod_pref"]),
+            "power_spectrum": {str(name): power[:, k] for k, name in enumerate(archive["columns"])},
+            "power_iters": archive["power_iter"],
+            "ellipse": {
+                int(i): (str(name), int(n))
+                for i, name, n in zip(archive["ellipse_iter"], archive["ellipse_file"], archive["ellipse_rows"])
+            },
+        }
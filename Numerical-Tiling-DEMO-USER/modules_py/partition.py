@@ -0,0 +1,258 @@
+# modules_py/partition.py
+import os
+import glob
+import numpy as np
+from modules_py.architecture import MODE_FOLDERS, read_accident_table, read_affected_modes
+from modules_py.generate_fortran import BACKGROUND_FOLDER
+from modules_py.output_format import OUTPUT_COLUMNS, read_output
+
+"""
+Module responsible for distributing the injected modes among the parallel
+parts (`parallel` entries of the profiles) so that every part takes about the
+same time.
+
+The cost of each mode is estimated from the number of gl8 steps it needs to
+reach the end of inflation and from the number of accidents it carries, or
+taken from the per-mode timings (`Timing_*.dat`) written by a previous run. The
+modes are then split into contiguous ranges that minimize the cost of the
+slowest part.
+"""
+
+# Position of H and N (e-folds) in the state vector (background table)
+BACKGROUND_COLUMNS = {
+    "single": {"Hubble": 2, "N": 3},
+    "two_field": {"Hubble": 4, "N": 5},
+}
+
+
+# ============================================================
+# Measured cost of each mode
+# ============================================================
+
+def read_mode_timings(mode, mod_pref):
+    """
+    Return {iter: seconds} from the `Timing_*_XXX.dat` files written by the
+    Fortran codes of case `mod_pref` (columns: iter, seconds, gl8 steps, gl8 sweeps).
+    """
+    if mode not in MODE_FOLDERS:
+        raise ValueError(f"Unknown mode '{mode}'.")
+
+    mod_tag = f"{mod_pref:03d}"
+    folder = os.path.join(MODE_FOLDERS[mode], f"Data_&_Codes_{mod_tag}", f"Evolution_{mod_tag}")
+
+    timings = {}
+    for path in sorted(glob.glob(os.path.join(folder, f"Timing_*_{mod_tag}.dat"))):
+        with open(path) as f:
+            for line in f:
+                fields = line.split()
+                if len(fields) >= 2:
+                    timings[int(fields[0])] = float(fields[1])
+
+    return timings
+
+
+def end_of_inflation(mode):
+    """
+    (N, H) at the end of inflation, read from the case-0 power spectrum
+    (None if case 0 has not been run).
+    """
+    path = os.path.join(
+        MODE_FOLDERS[mode], "Data_&_Codes_000", "Evolution_000", "Power_Spectrum_PS_000.dat"
+    )
+    if not os.path.exists(path):
+        return None
+
+    data, header = read_output(path)
+    columns = header["columns"] if header is not None else OUTPUT_COLUMNS[mode]["power_spectrum"]
+    col_N, col_H = columns.index("N"), columns.index("Hubble")
+    last = np.argmax(data[:, col_N])
+    return float(data[last, col_N]), float(data[last, col_H])
+
+
+def read_background_table(mode, mod_pref):
+    """
+    H at every injection point and the gl8 step, from the shared background
+    table of case `mod_pref` (`fortran_background_cache = .true.`).
+    Returns (H_inj, step) or None if the case has no table.
+    """
+    mod_tag = f"{mod_pref:03d}"
+    pointer = os.path.join(MODE_FOLDERS[mode], f"Data_&_Codes_{mod_tag}", f"Background_{mod_tag}.txt")
+    if not os.path.exists(pointer):
+        return None
+    with open(pointer) as f:
+        tag = f.read().strip()
+    path = os.path.join(MODE_FOLDERS[mode], BACKGROUND_FOLDER, f"{tag}.bin")
+    if not tag or not os.path.exists(path):
+        return None
+
+    # N_mod, nback (int32) | kphys, dt | inj_back(nback, N_mod) | inj_kcom(N_mod)
+    with open(path, "rb") as f:
+        N_mod, nback = np.fromfile(f, dtype=np.int32, count=2)
+        kphys, dt = np.fromfile(f, dtype=np.float64, count=2)
+        inj_back = np.fromfile(f, dtype=np.float64, count=nback * N_mod).reshape(N_mod, nback)
+
+    return inj_back[:, BACKGROUND_COLUMNS[mode]["Hubble"]], dt / 0.05
+
+
+# ============================================================
+# Cost model
+# ============================================================
+
+def mode_costs(mode, params, N_end=None, accident_weight=1.0, timings_from=None):
+    """
+    Estimated cost of every injected mode (array of length N_mod, index iter - 1).
+
+    Model:
+        cost(iter) = steps(iter) * (1 + accident_weight * n_acc(iter))
+
+    - `steps`: gl8 steps from N_ref(iter) to the end of inflation. The step is
+      fixed in cosmic time, so steps = (1/step) ∫ dN / H, integrated (H linear
+      between nodes) over the H values of the background table (`fortran_background_cache = .true.`)
+      and the end of inflation of case 0. Without the table, the remaining
+      e-folds N_end - N_ref(iter) are used instead (H taken as constant).
+    - `N_end`: end of inflation; by default taken from the case-0 power
+      spectrum, or one N_step after the last injection if case 0 is missing.
+    - `n_acc`: accidents carried by the mode (accident table of the case).
+    - With `fortran_affected_only = .true.`, unaffected modes cost nothing.
+    - `timings_from`: mod_pref of a previous run; its measured timings replace
+      the model for the modes it contains (the rest is rescaled to match).
+    """
+    if mode not in MODE_FOLDERS:
+        raise ValueError(f"Unknown mode '{mode}'.")
+
+    N_mod = params["fortran_N_mod"]
+    N_step = params["fortran_N_step"]
+    mod_pref = params["fortran_mod_pref"]
+    iters = np.arange(1, N_mod + 1)
+    N_ref = params["fortran_N_initial_inj"] + N_step * iters
+
+    end = end_of_inflation(mode)
+    if N_end is None:
+        N_end = end[0] if end is not None else N_ref[-1] + N_step
+
+    # Accidents per mode
+    n_acc = np.zeros(N_mod)
+    if mod_pref != 0:
+        try:
+            counts = read_accident_table(mode, mod_pref)["counts"]
+            n_acc[:len(counts)] = counts[:N_mod]
+        except FileNotFoundError:
+            pass
+
+    background = read_background_table(mode, mod_pref)
+
+    if background is not None and end is not None:
+        # Cosmic time from each injection to the end: ∫ dN / H, with H linear
+        # in N between nodes (H falls to H_end quickly at the end of inflation)
+        H_inj, step = background
+        H_nodes = np.append(H_inj[:N_mod], end[1])
+        N_nodes = np.append(N_ref, max(N_end, N_ref[-1]))
+        Ha, Hb, dN = H_nodes[:-1], H_nodes[1:], np.diff(N_nodes)
+        flat = np.isclose(Ha, Hb, rtol=1e-8)
+        dt_nodes = np.where(
+            flat,
+            dN / Ha,
+            dN * np.log(Ha / Hb) / np.where(flat, 1.0, Ha - Hb),
+        )
+        steps = np.cumsum(dt_nodes[::-1])[::-1] / step
+    else:
+        steps = np.maximum(N_end - N_ref, N_step)
+
+    costs = steps * (1.0 + accident_weight * n_acc)
+
+    # Measured timings of a previous run
+    if timings_from is not None:
+        timings = read_mode_timings(mode, timings_from)
+        measured = np.array([i in timings for i in iters])
+        if measured.any():
+            scale = sum(timings[i] for i in iters[measured]) / np.sum(costs[measured])
+            costs = costs * scale
+            for i in iters[measured]:
+                costs[i - 1] = timings[i]
+
+    # Modes copied from case 0
+    affected_only = str(params.get("fortran_affected_only", ".false.")).strip().lower() in [".true."]
+    if affected_only and mod_pref != 0:
+        affected = np.zeros(N_mod, dtype=bool)
+        affected[np.array(read_affected_modes(mode, mod_pref), dtype=int) - 1] = True
+        costs = np.where(affected, costs, 0.0)
+
+    return costs
+
+
+# ============================================================
+# Balanced contiguous ranges
+# ============================================================
+
+def balanced_ranges(costs, n_parts):
+    """
+    Split the modes 1..len(costs) into at most `n_parts` contiguous ranges
+    [(first, last), ...] minimizing the cost of the most expensive range
+    (bisection on that cost + greedy filling).
+    """
+    costs = np.asarray(costs, dtype=float)
+    n_parts = max(1, min(n_parts, len(costs)))
+
+    def greedy(limit):
+        ranges, first, acc = [], 1, 0.0
+        for i, c in enumerate(costs, start=1):
+            if acc + c > limit and i > first:
+                ranges.append((first, i - 1))
+                first, acc = i, 0.0
+            acc += c
+        ranges.append((first, len(costs)))
+        return ranges
+
+    lo, hi = float(np.max(costs)), float(np.sum(costs))
+    if hi <= 0.0:
+        return [(1, len(costs))]
+
+    for _ in range(100):
+        mid = 0.5 * (lo + hi)
+        if len(greedy(mid)) <= n_parts:
+            hi = mid
+        else:
+            lo = mid
+
+    return greedy(hi)
+
+
+def balanced_parallel(mode, params, n_parts, N_end=None, accident_weight=1.0, timings_from=None):
+    """
+    Build the `parallel` entries ("Complete" + "Part_i") for `n_parts` cores,
+    with ranges balanced according to `mode_costs`. The result can be passed
+    as `parallel_overrides` to `build_parameter_sets`.
+    """
+    costs = mode_costs(mode, params, N_end, accident_weight, timings_from)
+    ranges = balanced_ranges(costs, n_parts)
+    total = np.sum(costs)
+
+    parallel = [
+        {"fortran_part_iter_parallel": "Complete", "fortran_iter_initial": 1, "fortran_iter_final": len(costs)}
+    ]
+
+    print(f"⚖️ Balanced partition of {len(costs)} modes into {len(ranges)} parts")
+    for i, (first, last) in enumerate(ranges, start=1):
+        share = np.sum(costs[first - 1:last]) / total if total > 0 else 0.0
+        print(f"  Part_{i}: modes {first}–{last} ({100 * share:.1f} % of the estimated cost)")
+        parallel.append(
+            {"fortran_part_iter_parallel": f"Part_{i}", "fortran_iter_initial": first, "fortran_iter_final": last}
+        )
+
+    return parallel
+
+
+def worker_parallel(params):
+    """
+    `parallel` entry for dynamic scheduling: a single "Worker" source that
+    covers every mode and integrates the ones it receives on stdin
+    (`run_simulation(..., runner="workers")`).
+    """
+    return [
+        {
+            "fortran_part_iter_parallel": "Worker",
+            "fortran_iter_initial": 1,
+            "fortran_iter_final": params["fortran_N_mod"],
+            "fortran_worker": ".true.",
+        }
+    ]
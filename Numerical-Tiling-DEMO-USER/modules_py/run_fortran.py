@@ -1,33 +1,193 @@
 # modules_py/run_fortran.py
 import os
+import re
 import glob
+import hashlib
+import heapq
+import itertools
+import shlex
+import shutil
+import signal
 import subprocess
+import threading
 import time
-from modules_py.architecture import MODE_FOLDERS
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import numpy as np
+from modules_py.architecture import MODE_FOLDERS, changed_modes, read_affected_modes, read_block_manifest
+from modules_py.generate_fortran import BACKGROUND_FOLDER
+from modules_py.output_format import iter_rows, read_header, write_archive, write_rows
+from modules_py.partition import mode_costs
 
-def run_simulation(mode, param_sets):
+# Compiled binaries, named by the hash of their source, includes and compile command
+# (shared by every case and every run; see `compile_sources`)
+COMPILE_CACHE_FOLDER = "compile_cache"
+
+# Fortran include lines (accident blocks intX_block_NNN.inc, summaries, ...)
+INCLUDE_PATTERN = re.compile(r"^\s*include\s+['\"]([^'\"]+)['\"]", re.IGNORECASE | re.MULTILINE)
+
+# ============================================================
+# Fortran compilers (expandable: ifort, nvfortran, ...)
+# "setup" is run before the compiler in the same shell
+# "openmp" is added to the flags for threaded binaries (run_simulation(..., threads=n))
+# ============================================================
+
+COMPILERS = {
+    "ifx": {
+        "setup": "source /opt/intel/oneapi/setvars.sh",
+        "flags": "-r8 -O3",
+        "openmp": "-qopenmp",
+    },
+    "gfortran": {
+        "setup": "",
+        "flags": "-fdefault-real-8 -fdefault-double-8 -ffree-line-length-none -O3",
+        "openmp": "-fopenmp",
+    },
+}
+
+
+def detect_compiler():
+    """
+    Return the first available compiler of `COMPILERS`: `ifx` (Intel oneAPI)
+    if it is installed, otherwise `gfortran`.
+    """
+    if shutil.which("ifx") or os.path.exists("/opt/intel/oneapi/setvars.sh"):
+        return "ifx"
+    if shutil.which("gfortran"):
+        return "gfortran"
+    raise RuntimeError("No Fortran compiler found (ifx or gfortran).")
+
+
+def compile_command(src, exe, compiler=None, openmp=False):
+    """
+    Shell command that compiles `src` into `exe` with the selected compiler
+    (detected with `detect_compiler` if None), with OpenMP if `openmp`.
+    """
+    compiler = compiler or detect_compiler()
+    if compiler not in COMPILERS:
+        raise ValueError(f"Unknown compiler '{compiler}'.")
+
+    cfg = COMPILERS[compiler]
+    flags = f"{cfg['flags']} {cfg['openmp']}" if openmp else cfg["flags"]
+    command = f"{compiler} {flags} {shlex.quote(src)} -o {shlex.quote(exe)}"
+    return f"{cfg['setup']} && {command}" if cfg["setup"] else command
+
+
+def runtime_command(command, compiler=None):
+    """
+    Prefix `command` (execution of a compiled binary) with the environment
+    setup of the compiler, needed by its runtime libraries.
+    """
+    compiler = compiler or detect_compiler()
+    setup = COMPILERS[compiler]["setup"]
+    return f"{setup} && {command}" if setup else command
+
+
+def run_simulation(mode, param_sets, runner="pool", workers=None, compiler=None,
+                   timeout=None, retries=0, on_complete=None, threads=None, resume=False,
+                   changed_only=False, modes=None):
     """
     Compile and execute the Fortran (.f90) codes generated for the selected mode,
-    using parallel executions via `screen`.
+    in parallel.
+
+    First, every .f90 file is compiled in a separate parallel stage (`ifx` if
+    available, otherwise `gfortran`; see `COMPILERS` and the `compiler` argument).
+    The binaries are cached in `compile_cache/`, named by the hash of the source,
+    of every file it includes (the `intX_block_NNN.inc` accident blocks) and of the
+    compile command, so unchanged sources (e.g. case 0 when a notebook is run
+    again) are not compiled again (see `compile_sources`). The compile time is
+    reported separately from the run time.
+
+    Then, for each parallelization block, the binary is run as a job of the
+    process pool (`runner="pool"`, DEFAULT), or in a separate `screen` session
+    (`runner="screen"`).
+
+    With the pool, at most `workers` parts run at the same time (default: one
+    per part, up to the number of CPUs). Each part reports its exit status as
+    soon as it finishes, its output is written to `<part>.log`, it is stopped
+    after `timeout` seconds and retried up to `retries` times.
+    `on_complete(result)` is called for every finished part (see `run_jobs`).
+    If a part fails, a RuntimeError is raised before merging.
+
+    With `screen`, the status of the sessions is monitored every 15 seconds
+    until all sessions are complete.
+
+    With `runner="workers"` (dynamic scheduling), the "Worker" source (see
+    `partition.worker_parallel`) is compiled once and `workers` copies of it
+    pull the modes one by one from a shared queue, most expensive first
+    (`partition.mode_costs`). Each mode is written to its own file and the
+    driver merges them; the cost of each mode goes to `Timing_Worker_XXX.dat`.
+
+    With `threads=n` (pool and screen runners), the parts are compiled with
+    OpenMP (`COMPILERS[...]["openmp"]`) and each one shares its modes among
+    `n` threads (`OMP_NUM_THREADS`); the rows are still written in order.
+    A single part covering every mode then uses a whole node from one
+    process, e.g. `balanced_parallel(mode, params, 1)` with `threads=os.cpu_count()`.
+
+    Once completed, the rows of the parts are merged as streams into a single
+    final file within the corresponding evolution directory, in the order of
+    the injected modes (`merge_power_spectrum`); missing or duplicated modes
+    raise an error. The case archive `Case_XXX.npz` (power spectrum and index
+    of the ellipse files, read by `load_structure`) is written next to it.
 
-    For each parallelization block:
-      - Compile the .f90 file using the Intel `ifx` compiler.
-      - Run each binary in a separate `screen` session.
+    With `fortran_affected_only = .true.`, the binaries only integrate the modes
+    affected by accidents; the remaining rows of the power spectrum (and the
+    ellipse files) are copied from the case-0 outputs, which must exist.
 
-    The status of the simulations is monitored every 15 seconds until
-    all sessions are complete. Once completed, the partial
-    power spectrum files are concatenated into a single final file within the
-    corresponding evolution directory.
+    With `fortran_background_cache = .true.`, the background pre-pass is
+    compiled and executed first (only if its table does not exist yet), and
+    every part reads the injection states from that table.
 
-    Note:
-    - By default, `ifx` (Intel oneAPI) is used on Linux.
-    - It can be easily adapted to other compilers (gfortran, ifort)
-      or other systems (e.g., macOS).
+    With `fortran_accident_table = .true.`, the sources do not depend on the
+    case: every case runs the same cached binaries, with the accident table of
+    the case, `intX_block_file/intX_accidents.bin`, as argument.
+
+    With `resume=True`, an interrupted run (dead `screen` session, reboot) is
+    continued instead of started over. Every binary records each completed
+    mode in its timing file (`Timing_<part>_XXX.dat`, or `Timing_Worker_XXX.dat`
+    written by the driver), right after its row. Finished parts and modes are
+    skipped, the other parts continue from their last completed iter
+    (`TILING_RESUME_FROM`, see `resume_point`). The cached binary of each
+    launch is recorded in `<session>.build`: a part whose binary changed (source,
+    includes or compile command) is started over.
+
+    Every run keeps a copy of the block manifest of the case written by
+    `make_split_incs` (`Block_Manifest_XXX.dat`, hash of the accident block of
+    each mode). With `changed_only=True` (`runner="workers"`), only the modes
+    whose block changed since that run are integrated, and their rows replace
+    the old ones in the existing combined file (e.g. after editing one tile of
+    the accident grid). Any other change of the parameters needs a full run.
+
+    With `modes` (a list of iters, `runner="workers"`), only these modes are
+    integrated and the combined power spectrum has one row per mode of
+    `modes`: a non-uniform spectrum, whose iters are stored in the case
+    archive (see `adaptive.adaptive_simulation`). With `resume=True`, the
+    modes already integrated by the previous run are kept.
     """
+    if runner not in ["pool", "screen", "workers"]:
+        raise ValueError(f"Unknown runner '{runner}'.")
+    if threads and runner == "workers":
+        raise ValueError("threads is not supported by runner 'workers' (each worker integrates one mode at a time).")
+    if changed_only and runner != "workers":
+        raise ValueError("changed_only needs runner 'workers' (the changed modes are sent to a worker binary).")
+    if changed_only and resume:
+        raise ValueError("resume and changed_only cannot be combined.")
+    if modes is not None and runner != "workers":
+        raise ValueError("modes needs runner 'workers' (the modes are sent to a worker binary).")
+    if modes is not None and changed_only:
+        raise ValueError("modes and changed_only cannot be combined.")
 
     # Extract from param_sets
     mod_pref = param_sets[0]["fortran_mod_pref"]
     parallel_sets = param_sets
+    affected_only = str(param_sets[0].get("fortran_affected_only", ".false.")).strip().lower() in [".true."]
+    affected_only = affected_only and mod_pref != 0
+    accident_table = str(param_sets[0].get("fortran_accident_table", ".false.")).strip().lower() in [".true."]
+    compiler = compiler or detect_compiler()
+
+    if affected_only:
+        affected_modes = read_affected_modes(mode, mod_pref)
+        print(f"🎯 Integrating {len(affected_modes)} affected modes (the rest is taken from case 0)")
 
 
     # Build paths
@@ -37,53 +197,207 @@ def run_simulation(mode, param_sets):
     folder_tag = f"Data_&_Codes_{mod_tag}"
     target_dir = os.path.join(root_folder, folder_tag)
     
+    # Shared background table (before any part is launched)
+    ensure_background_table(mode, mod_pref, compiler)
+
+    # Dynamic scheduling: most expensive modes first
+    if runner == "workers":
+        costs = mode_costs(mode, param_sets[0])
+
     # Change to the directory where the .f90 files are located
     original_dir = os.getcwd()
     os.chdir(target_dir)
     
     try:
         # List of .f90 files according to mode
+        part_pattern = "Worker" if runner == "workers" else "Part_*"
         if mode == "single":
-            sources = sorted(glob.glob(f"Tiling_Single_Field_Case_{mod_tag_bash}_Part_*.f90"))
+            sources = sorted(glob.glob(f"Tiling_Single_Field_Case_{mod_tag_bash}_{part_pattern}.f90"))
         if mode == "two_field":
-            sources = sorted(glob.glob(f"Tiling_Two_Field_Case_{mod_tag_bash}_Part_*.f90"))
+            sources = sorted(glob.glob(f"Tiling_Two_Field_Case_{mod_tag_bash}_{part_pattern}.f90"))
+
+        if runner == "workers" and not sources:
+            raise FileNotFoundError(
+                f"No Worker source in {target_dir} (add partition.worker_parallel(...) to the parallel entries)."
+            )
+
+        # Runtime accident table of this case (no table: case 0 without accidents)
+        table_arg = ""
+        if accident_table:
+            table = os.path.join("..", f"int{mod_pref}_block_file", f"int{mod_pref}_accidents.bin")
+            if os.path.exists(table):
+                table_arg = f" {table}"
+            elif mod_pref != 0:
+                raise FileNotFoundError(f"Accident table not found: {table} (run make_split_incs first).")
+
+        # The per-part files go in the Evolution folder (which Fortran also creates)
+        folder_Evolution = f"Evolution_{mod_tag}"
+        output_file = os.path.join(folder_Evolution, f"Power_Spectrum_PS_{mod_tag}.dat")
 
-        # Compile and run with screen
+        # Block hashes of the case (make_split_incs) and of its last run
+        manifest = os.path.join("..", f"int{mod_pref}_block_file", f"int{mod_pref}_block_manifest.dat")
+        snapshot = os.path.join(folder_Evolution, f"Block_Manifest_{mod_tag}.dat")
+        if changed_only:
+            current, previous = read_block_manifest(manifest), read_block_manifest(snapshot)
+            if current is None or previous is None or not os.path.exists(output_file):
+                raise FileNotFoundError(
+                    f"No previous run of case {mod_pref} to update: {snapshot} (run the whole case first)."
+                )
+            changed = changed_modes(previous, current)
+            print(f"🔁 {len(changed)} modes changed since the last run: {changed[:10]}{' ...' if len(changed) > 10 else ''}")
+        part_params = {p["fortran_part_iter_parallel"]: p for p in parallel_sets}
+        part_modes = set(affected_modes) if affected_only else None
+
+        # Compile stage (cached binaries are reused)
+        binaries = compile_sources(
+            sources, os.path.join("..", COMPILE_CACHE_FOLDER), compiler, openmp=bool(threads), workers=workers
+        )
+
+        # One job per part
+        jobs = []
         for src in sources:
-            exe = src.replace(".f90", ".out")
             session = src.replace(".f90", "")
-            print(f"🧩 Compiling and executing: {src} → {exe} (screen: {session})")
-            subprocess.run(
-                ["screen", "-dmS", session, "bash", "-c", f"source /opt/intel/oneapi/setvars.sh && ifx -r8 -O3 {src} -o {exe} && ./{exe}"],
-                check=True
-            )
+            part = session.split(f"_Case_{mod_tag_bash}_", 1)[1]
+            tag = os.path.basename(binaries[src])
+            unchanged = resume and read_build_tag(f"{session}.build") == tag
+            run = f"{binaries[src]}{table_arg}"
 
-        # Wait until they finish
-        print("⏳ Waiting for the simulations to finish...")
-        while True:
-            output = subprocess.run(["screen", "-ls"], capture_output=True, text=True)
-            if "No Sockets found" in output.stdout:
-                print("✅ All simulations are complete.")
-                break
+            if resume and not unchanged and os.path.exists(f"{session}.build"):
+                print(f"⚠️ {src} changed since the interrupted run: {part} starts over")
+
+            # Continue the part from its last completed mode
+            if resume and unchanged and runner != "workers":
+                params = part_params[part]
+                start = resume_point(params, folder_Evolution, part_modes)
+                if start > params["fortran_iter_final"]:
+                    print(f"⏭️ {session} already complete")
+                    continue
+                if start > params["fortran_iter_initial"]:
+                    print(f"⏯️ Resuming {session} from mode {start}")
+                    run = f"TILING_RESUME_FROM={start} {run}"
+
+            if threads:
+                run = f"OMP_NUM_THREADS={int(threads)} {run}"
+
+            # The tag is written before running: the outputs were produced by this binary
+            stamp = f"echo {shlex.quote(tag)} > {shlex.quote(session + '.build')}"
+            print(f"▶️ Executing: {run} ({session})")
+            command = runtime_command(f"{stamp} && {run}", compiler)
+
+            jobs.append({"name": session, "command": command, "cwd": os.getcwd(), "run": run,
+                         "stamp": stamp, "unchanged": unchanged})
+
+        run_start = time.time()
+
+        if runner == "workers":
+            # Schedule the modes dynamically on copies of the worker
+            subprocess.run(["bash", "-c", jobs[0]["stamp"]], check=True)
+
+            iters = affected_modes if affected_only else list(range(1, param_sets[0]["fortran_N_mod"] + 1))
+            if modes is not None:
+                modes_set = set(modes)
+                iters = [iter_val for iter_val in iters if iter_val in modes_set]
+            if changed_only:
+                iters = changed
+            iters = sorted(iters, key=lambda i: -costs[i - 1])
+
+            # The driver records each mode as soon as its file is written
+            os.makedirs(folder_Evolution, exist_ok=True)
+            timing_file = os.path.join(folder_Evolution, f"Timing_Worker_{mod_tag}.dat")
+            if jobs[0]["unchanged"]:
+                finished = worker_records(timing_file, mod_tag, folder_Evolution)
+                iters = [iter_val for iter_val in iters if iter_val not in finished]
+                print(f"⏯️ Resuming: {len(finished)} modes already integrated")
+            elif changed_only and os.path.exists(timing_file):
+                # Keep the records of the modes that are not integrated again
+                with open(timing_file) as f:
+                    records = [line for line in f if line.strip() and int(line.split()[0]) not in changed]
+                with open(timing_file, "w") as f:
+                    f.writelines(records)
             else:
-                print("💡 Still running screens...")
-                time.sleep(15)
+                open(timing_file, "w").close()
 
-        # Collect data
-        parts = [
-            f"Power_Spectrum_PS_{p['fortran_part_iter_parallel']}_{mod_tag}.dat"
-            for p in parallel_sets
-            if p["fortran_part_iter_parallel"] != "Complete"
-        ]
+            timing_lock = threading.Lock()
+
+            def record(result):
+                with timing_lock, open(timing_file, "a") as f:
+                    f.write(timing_line(result))
+                if on_complete is not None:
+                    on_complete(result)
+
+            if iters:
+                print(f"⏳ Scheduling {len(iters)} modes on {workers or min(len(iters), os.cpu_count() or 1)} workers...")
+                run_workers(runtime_command(jobs[0]["run"], compiler), iters, workers=workers, on_complete=record)
+            print("✅ All simulations are complete.")
+
+        elif runner == "pool":
+            print(f"⏳ Running {len(jobs)} parts...")
+            results = run_jobs(jobs, workers=workers, timeout=timeout, retries=retries, on_complete=on_complete)
+
+            failed = [r["name"] for r in results if r["returncode"] != 0]
+            if failed:
+                raise RuntimeError(f"Simulations failed: {', '.join(failed)} (see the .log files in {target_dir}).")
+            print("✅ All simulations are complete.")
+
+        else:
+            for job in jobs:
+                subprocess.run(
+                    ["screen", "-dmS", job["name"], "bash", "-c", job["command"]],
+                    check=True
+                )
+
+            # Wait until they finish
+            print("⏳ Waiting for the simulations to finish...")
+            while True:
+                output = subprocess.run(["screen", "-ls"], capture_output=True, text=True)
+                if "No Sockets found" in output.stdout:
+                    print("✅ All simulations are complete.")
+                    break
+                else:
+                    print("💡 Still running screens...")
+                    time.sleep(15)
 
+        print(f"⏱️ Run time: {time.time() - run_start:.1f} s")
+
+        # Collect data
         # The combined file goes in the Evolution folder (which Fortran already created).
-        folder_Evolution = f"Evolution_{mod_tag}"
-        output_file = os.path.join(folder_Evolution, f"Power_Spectrum_PS_{mod_tag}.dat")
+        if runner == "workers":
+            # Records of this run and of the interrupted ones, in the order of iter
+            with open(timing_file) as f:
+                lines = sorted(f, key=lambda line: int(line.split()[0]))
+            with open(timing_file, "w") as f:
+                f.writelines(lines)
+            expected = set(range(1, param_sets[0]["fortran_N_mod"] + 1)) if modes is None else set(modes)
+            integrated = expected & set(affected_modes) if affected_only else expected
+            if changed_only:
+                integrated = set(changed)
+            sources = [mode_file_rows(iter_val, mod_tag, folder_Evolution) for iter_val in sorted(integrated)]
+            sources = [source for source in sources if source is not None]
+
+            # The other modes keep their rows of the previous combined file
+            if changed_only:
+                sources.append(combined_rows(output_file, skip=integrated | (set(previous) - set(current)),
+                                             iters=archive_iters(output_file)))
+        else:
+            parts = [p for p in parallel_sets if p["fortran_part_iter_parallel"].startswith("Part_")]
+            expected = set()
+            for p in parts:
+                expected.update(range(p["fortran_iter_initial"], p["fortran_iter_final"] + 1))
+            integrated = expected & set(affected_modes) if affected_only else expected
+            sources = [part_rows(p, folder_Evolution) for p in parts]
+
+        # Accident-free modes (rows and ellipse files) from case 0
+        if affected_only and not changed_only:
+            not_expected = set(range(1, param_sets[0]["fortran_N_mod"] + 1)) - expected
+            sources.append(baseline_rows(skip=integrated | not_expected))
+            for iter_val in sorted(expected - integrated):
+                copy_baseline_ellipse(param_sets[0], folder_Evolution, iter_val)
 
-        with open(output_file, "w") as outfile:
-            for fname in parts:
-                with open(os.path.join(folder_Evolution, fname)) as infile:
-                    outfile.write(infile.read())
+        merge_power_spectrum(sources, output_file, expected, mod_pref)
+        if os.path.exists(manifest):
+            shutil.copyfile(manifest, snapshot)
+        archive = write_case_archive(mode, param_sets[0], folder_Evolution, output_file, sorted(expected))
+        print(f"📦 Case archive: {archive}")
 
         print(f"✅ Combined file created: {output_file}")
         return output_file
@@ -91,3 +405,557 @@ def run_simulation(mode, param_sets):
     finally:
         # Return to the original directory
         os.chdir(original_dir)
+
+
+def part_rows(params, folder_Evolution):
+    """
+    Header and (iter, row) records of the power spectrum file of one part.
+
+    The injected mode of each row is read from the timing file of the part,
+    which Fortran writes in the same order (the modes skipped with
+    `fortran_affected_only = .true.` are absent from both). A part that did
+    not finish has fewer rows than modes in its timing file, or no file.
+    """
+    mod_tag = f"{params['fortran_mod_pref']:03d}"
+    part = params["fortran_part_iter_parallel"]
+    path = os.path.join(folder_Evolution, f"Power_Spectrum_PS_{part}_{mod_tag}.dat")
+    timing = os.path.join(folder_Evolution, f"Timing_{part}_{mod_tag}.dat")
+    if not os.path.exists(path) or not os.path.exists(timing):
+        raise FileNotFoundError(f"Outputs of {part} not found: {path} (did the part finish?).")
+
+    with open(timing) as f:
+        iters = [int(line.split()[0]) for line in f if line.strip()]
+
+    def records():
+        remaining = iter(iters)
+        for row in iter_rows(path):
+            iter_val = next(remaining, None)
+            if iter_val is None:
+                raise ValueError(f"{path} has more rows than modes in {timing}.")
+            yield iter_val, row
+        if next(remaining, None) is not None:
+            raise ValueError(f"{path} has fewer rows than modes in {timing} (did the part finish?).")
+
+    return read_header(path), records()
+
+
+def resume_point(params, folder_Evolution, modes=None):
+    """
+    First mode to integrate when resuming one part: the modes listed in its
+    timing file are complete (Fortran flushes each line right after the row of
+    its mode), so the part continues after the last one. Rows or records written
+    after it (interrupted write) are truncated. `modes` is the set of modes the
+    part integrates (None: all of them).
+
+    Returns `fortran_iter_initial` if the part has to start over (no outputs,
+    or outputs that do not match), or `fortran_iter_final + 1` if it is complete.
+    """
+    mod_tag = f"{params['fortran_mod_pref']:03d}"
+    part = params["fortran_part_iter_parallel"]
+    first, last = params["fortran_iter_initial"], params["fortran_iter_final"]
+    path = os.path.join(folder_Evolution, f"Power_Spectrum_PS_{part}_{mod_tag}.dat")
+    timing = os.path.join(folder_Evolution, f"Timing_{part}_{mod_tag}.dat")
+    if not os.path.exists(path) or not os.path.exists(timing):
+        return first
+
+    # Complete records only (one full line per mode)
+    with open(timing) as f:
+        records = [line for line in f if line.endswith("\n") and len(line.split()) == 4]
+    if not records:
+        return first
+
+    # Keep the first len(records) rows of the power spectrum
+    header = read_header(path)
+    if header is None:
+        with open(path) as f:
+            rows = [line for line in f if line.endswith("\n")]
+        if len(rows) < len(records):
+            return first
+        with open(path, "w") as f:
+            f.writelines(rows[:len(records)])
+    else:
+        size = header["offset"] + len(records) * header["nout"] * header["real_bytes"]
+        if os.path.getsize(path) < size:
+            return first
+        os.truncate(path, size)
+    with open(timing, "w") as f:
+        f.writelines(records)
+
+    done = int(records[-1].split()[0])
+    remaining = [i for i in range(done + 1, last + 1) if modes is None or i in modes]
+    return remaining[0] if remaining else last + 1
+
+
+def worker_records(timing_file, mod_tag, folder_Evolution):
+    """
+    Modes completed by an interrupted `runner="workers"` run: those recorded in
+    its timing file whose power spectrum file exists. The records of the other
+    modes are dropped.
+    """
+    if not os.path.exists(timing_file):
+        return set()
+
+    with open(timing_file) as f:
+        records = [line for line in f if line.endswith("\n") and len(line.split()) == 4]
+    records = [
+        line for line in records
+        if os.path.exists(os.path.join(folder_Evolution, f"Power_Spectrum_PS_Mode_{int(line.split()[0]):06d}_{mod_tag}.dat"))
+    ]
+    with open(timing_file, "w") as f:
+        f.writelines(records)
+    return {int(line.split()[0]) for line in records}
+
+
+def timing_line(result):
+    """Line of a timing file: iter, seconds, gl8 steps and sweeps (same format as Fortran)."""
+    return f"{result['iter']:8d} {result['seconds']:24.16E} {result['steps']:12d} {result['sweeps']:12d}\n"
+
+
+def mode_file_rows(iter_val, mod_tag, folder_Evolution):
+    """
+    Header and (iter, row) record of the file of one mode written by a worker
+    (`runner="workers"`), or None if the file is missing.
+    """
+    path = os.path.join(folder_Evolution, f"Power_Spectrum_PS_Mode_{iter_val:06d}_{mod_tag}.dat")
+    if not os.path.exists(path):
+        return None
+    return read_header(path), ((iter_val, row) for row in iter_rows(path))
+
+
+def combined_rows(path, skip=(), iters=None):
+    """
+    Header and (iter, row) records of a combined power spectrum, leaving out
+    the modes in `skip`. `iters` is the iter of each row (see `archive_iters`);
+    by default row `iter - 1` is the mode `iter`.
+    """
+    records = zip(iters if iters is not None else itertools.count(1), iter_rows(path))
+    return read_header(path), ((int(iter_val), row) for iter_val, row in records if iter_val not in skip)
+
+
+def archive_iters(power_file):
+    """
+    Iter of each row of a combined power spectrum, from the case archive
+    written next to it (`Case_XXX.npz`), or None if there is no up-to-date
+    archive (one row per mode 1..n).
+    """
+    archive = os.path.join(
+        os.path.dirname(power_file),
+        os.path.basename(power_file).replace("Power_Spectrum_PS_", "Case_").replace(".dat", ".npz"),
+    )
+    if not os.path.exists(archive) or os.path.getmtime(archive) < os.path.getmtime(power_file):
+        return None
+    with np.load(archive) as data:
+        return data["power_iter"]
+
+
+def baseline_rows(skip):
+    """
+    Records of the case-0 combined power spectrum (see `combined_rows`).
+    Must be called from a `Data_&_Codes_XXX` folder.
+    """
+    baseline_file = os.path.join("..", "Data_&_Codes_000", "Evolution_000", "Power_Spectrum_PS_000.dat")
+    if not os.path.exists(baseline_file):
+        raise FileNotFoundError(
+            f"Case-0 power spectrum not found: {baseline_file} (run case 0 first)."
+        )
+
+    return combined_rows(baseline_file, skip, archive_iters(baseline_file))
+
+
+def check_same_format(header, other):
+    """
+    Rows can only be merged if all the files were written with the same
+    `fortran_binary_output` (and the same columns).
+    """
+    if (header is None) != (other is None) or (
+        header is not None and (header["columns"], header["real_bytes"]) != (other["columns"], other["real_bytes"])
+    ):
+        raise ValueError("The outputs to merge were written with different fortran_binary_output "
+                         "(with fortran_affected_only, run case 0 again).")
+
+
+def merge_power_spectrum(sources, output_file, expected, mod_pref):
+    """
+    Write the combined power spectrum of a case, one row per injected mode in
+    the order of iter.
+
+    `sources` is a list of (header, records) pairs as returned by `part_rows`,
+    `mode_file_rows` or `baseline_rows`, each one in increasing iter. They are
+    merged as streams (rows are never held in memory), and the merge fails
+    if a mode appears twice, if a mode of `expected` is missing, or if the
+    sources do not share the same format. The previous combined file is only
+    replaced when the new one is complete.
+    """
+    header = sources[0][0] if sources else None
+    for other, _ in sources[1:]:
+        check_same_format(header, other)
+    if header is not None:
+        header = {**header, "mod_pref": mod_pref}
+
+    seen = []
+
+    def ordered_rows():
+        for iter_val, row in heapq.merge(*(records for _, records in sources), key=lambda record: record[0]):
+            if seen and iter_val <= seen[-1]:
+                raise ValueError(f"Mode {iter_val} appears in more than one output (overlapping parts?).")
+            seen.append(iter_val)
+            yield row
+
+    partial_file = output_file + ".partial"
+    try:
+        write_rows(partial_file, header, ordered_rows())
+        missing = sorted(set(expected) - set(seen))
+        if missing:
+            raise ValueError(f"{len(missing)} modes missing from the outputs: {missing[:10]}{' ...' if len(missing) > 10 else ''}")
+    except Exception:
+        if os.path.exists(partial_file):
+            os.remove(partial_file)
+        raise
+
+    os.replace(partial_file, output_file)
+
+
+def write_case_archive(mode, params, folder_Evolution, power_file, iters=None):
+    """
+    Write `Case_XXX.npz` next to the combined power spectrum: its columns, the
+    iter of each row (`iters`, default every mode 1..fortran_N_mod) and the
+    index of the ellipse files of those modes (see `output_format.write_archive`),
+    opened directly by `load_structure`. Returns the path of the archive.
+    """
+    mod_tag = f"{params['fortran_mod_pref']:03d}"
+    ellipse_files = {}
+    if str(params["fortran_ellipse"]).strip().lower() in [".true."]:
+        for iter_val in (range(1, params["fortran_N_mod"] + 1) if iters is None else iters):
+            path = os.path.join(folder_Evolution, f"Ellipse_P{mod_tag}_Iter_{iter_val:06d}.dat")
+            if iter_val % params["fortran_ellipse_resolution"] == 0 and os.path.exists(path):
+                ellipse_files[iter_val] = path
+
+    archive = os.path.join(folder_Evolution, f"Case_{mod_tag}.npz")
+    write_archive(archive, mode, params["fortran_mod_pref"], power_file, ellipse_files, iters)
+    return archive
+
+
+def copy_baseline_ellipse(params, folder_Evolution, iter_val):
+    """
+    Copy the case-0 ellipse file of mode `iter_val` (if it has one) into the
+    evolution folder of the case. Must be called from a `Data_&_Codes_XXX` folder.
+    """
+    use_ellipse = str(params["fortran_ellipse"]).strip().lower() in [".true."]
+    if not use_ellipse or iter_val % params["fortran_ellipse_resolution"] != 0:
+        return
+
+    mod_tag = f"{params['fortran_mod_pref']:03d}"
+    src = os.path.join("..", "Data_&_Codes_000", "Evolution_000", f"Ellipse_P000_Iter_{iter_val:06d}.dat")
+    dst = os.path.join(folder_Evolution, f"Ellipse_P{mod_tag}_Iter_{iter_val:06d}.dat")
+    if os.path.exists(src):
+        shutil.copyfile(src, dst)
+
+
+def build_key(src, compiler=None, openmp=False):
+    """
+    Hash of everything a binary depends on: the content of `src`, of every file
+    it includes (recursively; searched next to the including file, then next
+    to `src`) and the compile command (compiler, flags and OpenMP).
+    """
+    digest = hashlib.sha1(compile_command("source.f90", "binary.out", compiler, openmp).encode())
+    root = os.path.dirname(os.path.abspath(src))
+    seen = set()
+
+    def add(path):
+        seen.add(path)
+        with open(path, "rb") as f:
+            content = f.read()
+        digest.update(content)
+        for name in INCLUDE_PATTERN.findall(content.decode(errors="replace")):
+            candidates = [os.path.join(os.path.dirname(path), name), os.path.join(root, name)]
+            found = next((os.path.normpath(c) for c in candidates if os.path.exists(c)), None)
+            # A missing include fails at compile time; the key still changes with it
+            digest.update(f"include {name} {found is not None}".encode())
+            if found is not None and found not in seen:
+                add(found)
+
+    add(os.path.normpath(os.path.abspath(src)))
+    return digest.hexdigest()
+
+
+def compile_sources(sources, cache_dir, compiler=None, openmp=False, workers=None):
+    """
+    Compile stage of `run_simulation`: the binary of each source is
+    `<cache_dir>/Tiling_<key>.out` (see `build_key`), compiled only if it is not
+    in the cache yet. The missing binaries are compiled in parallel (at most
+    `workers` at a time, see `run_jobs`), each one into a temporary file that is
+    moved into the cache once complete, and the compile time is reported.
+
+    Returns {src: path of its binary}. A RuntimeError is raised if a compilation fails.
+    """
+    compiler = compiler or detect_compiler()
+    os.makedirs(cache_dir, exist_ok=True)
+    start = time.time()
+
+    binaries = {}
+    jobs = []
+    for src in sources:
+        exe = os.path.join(cache_dir, f"Tiling_{build_key(src, compiler, openmp)[:16]}.out")
+        if not os.path.exists(exe) and exe not in binaries.values():
+            partial = f"{exe}.{os.getpid()}.partial"
+            jobs.append({
+                "name": f"{src.replace('.f90', '')}_compile",
+                "command": f"{compile_command(src, partial, compiler, openmp)} && mv {shlex.quote(partial)} {shlex.quote(exe)}",
+                "cwd": os.getcwd(),
+            })
+        binaries[src] = exe
+
+    if jobs:
+        print(f"🧩 Compiling {len(jobs)} sources ({len(sources) - len(jobs)} cached in {cache_dir})...")
+        results = run_jobs(jobs, workers=workers)
+        failed = [r["name"] for r in results if r["returncode"] != 0]
+        if failed:
+            raise RuntimeError(f"Compilation failed: {', '.join(failed)} (see the .log files in {os.getcwd()}).")
+    else:
+        print(f"♻️ All {len(sources)} binaries found in {cache_dir}")
+
+    print(f"⏱️ Compile time: {time.time() - start:.1f} s")
+    return binaries
+
+
+def read_build_tag(path):
+    """Tag of the binary that last ran a part (see `run_simulation`), or None."""
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return f.read().strip()
+
+
+def ensure_background_table(mode, mod_pref, compiler=None):
+    """
+    Make sure the background table required by the sources of a case exists.
+
+    The table name is read from `Data_&_Codes_XXX/Background_XXX.txt`, written by
+    `generate_fortran_files` (empty when the case does not use a shared table).
+    If `background_cache/Background_<hash>.bin` is missing, the pre-pass is
+    compiled and executed synchronously inside `background_cache/`.
+    """
+    if mode not in MODE_FOLDERS:
+        raise ValueError(f"Unknown mode '{mode}'.")
+
+    root_folder = MODE_FOLDERS[mode]
+    mod_tag = f"{mod_pref:03d}"
+    pointer = os.path.join(root_folder, f"Data_&_Codes_{mod_tag}", f"Background_{mod_tag}.txt")
+
+    if not os.path.exists(pointer):
+        return None
+    with open(pointer) as f:
+        tag = f.read().strip()
+    if not tag:
+        return None
+
+    cache_dir = os.path.join(root_folder, BACKGROUND_FOLDER)
+    table = os.path.join(cache_dir, f"{tag}.bin")
+
+    if os.path.exists(table):
+        print(f"♻️ Reusing background table: {table}")
+        return table
+
+    src = f"{tag}.f90"
+    exe = f"{tag}.out"
+    print(f"🧩 Compiling and executing the background pre-pass: {src} → {exe}")
+    subprocess.run(
+        ["bash", "-c", f"{compile_command(src, exe, compiler)} && ./{exe}"],
+        cwd=cache_dir,
+        check=True
+    )
+
+    if not os.path.exists(table):
+        raise FileNotFoundError(f"Background pre-pass did not produce {table}.")
+
+    print(f"✅ Background table created: {table}")
+    return table
+
+
+# ============================================================
+# Job runner (process pool, no screen needed)
+# ============================================================
+
+def run_jobs(jobs, workers=None, timeout=None, retries=0, on_complete=None):
+    """
+    Run shell jobs in parallel, at most `workers` at a time (default: one per
+    job, up to the number of CPUs).
+
+    Each job is a dictionary with:
+      - "name":    label of the job (also the name of its log file)
+      - "command": command executed with `bash -c`
+      - "cwd":     working directory (default: the current one)
+
+    The stdout and stderr of every attempt are written to `<cwd>/<name>.log`.
+    A job that fails or runs longer than `timeout` seconds is retried up to
+    `retries` times. `on_complete(result)` is called as soon as each job
+    finishes.
+
+    Returns one result per job, in the order of `jobs`:
+        {"name", "returncode" (None after a timeout), "attempts",
+         "elapsed" (s), "log", "stdout"}
+    """
+    if not jobs:
+        return []
+
+    workers = workers or min(len(jobs), os.cpu_count() or 1)
+    results = [None] * len(jobs)
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {
+            pool.submit(run_job, job, timeout, retries): i
+            for i, job in enumerate(jobs)
+        }
+        for future in as_completed(futures):
+            result = future.result()
+            results[futures[future]] = result
+
+            if result["returncode"] == 0:
+                print(f"✅ {result['name']} finished in {result['elapsed']:.1f} s")
+            elif result["returncode"] is None:
+                print(f"⌛ {result['name']} timed out after {result['attempts']} attempt(s) (log: {result['log']})")
+            else:
+                print(f"❌ {result['name']} failed with exit code {result['returncode']} (log: {result['log']})")
+
+            if on_complete is not None:
+                on_complete(result)
+
+    return results
+
+
+def run_job(job, timeout=None, retries=0):
+    """
+    Run a single job of `run_jobs` (with retries) and return its result.
+    On timeout the whole process group of the job is killed.
+    """
+    cwd = job.get("cwd") or os.getcwd()
+    log = os.path.join(cwd, f"{job['name']}.log")
+    start = time.time()
+
+    with open(log, "w") as f:
+        for attempt in range(1, retries + 2):
+            f.write(f"# attempt {attempt}: {job['command']}\n")
+            f.flush()
+
+            proc = subprocess.Popen(
+                ["bash", "-c", job["command"]],
+                cwd=cwd,
+                stdout=f,
+                stderr=subprocess.STDOUT,
+                start_new_session=True,
+            )
+            try:
+                returncode = proc.wait(timeout=timeout)
+            except subprocess.TimeoutExpired:
+                os.killpg(proc.pid, signal.SIGKILL)
+                proc.wait()
+                returncode = None
+                f.write(f"# timeout after {timeout} s\n")
+
+            if returncode == 0:
+                break
+
+    with open(log) as f:
+        stdout = f.read()
+
+    return {
+        "name": job["name"],
+        "returncode": returncode,
+        "attempts": attempt,
+        "elapsed": time.time() - start,
+        "log": log,
+        "stdout": stdout,
+    }
+
+
+# ============================================================
+# Dynamic scheduler (long-lived worker binaries fed through stdin)
+# ============================================================
+
+def run_workers(command, iters, workers=None, cwd=None, on_complete=None):
+    """
+    Integrate the modes `iters` with `workers` copies of a worker binary
+    (`fortran_worker = .true.`) started with `command`.
+
+    Every worker takes the next mode of a shared queue, sends it through its
+    stdin and waits for its "DONE iter seconds steps sweeps" line before taking the
+    next one, so no core stays idle while modes remain. The output of worker
+    w goes to `<cwd>/Worker_<w>.log`. `on_complete(result)` is called as soon
+    as each mode is done.
+
+    Returns {iter: {"iter", "seconds", "steps", "sweeps", "worker"}}. A RuntimeError is
+    raised if a worker dies (the modes it was running are listed).
+    """
+    cwd = cwd or os.getcwd()
+    workers = workers or min(len(iters), os.cpu_count() or 1)
+
+    queue = deque(iters)
+    lock = threading.Lock()
+    done = {}
+    failed = []
+
+    def serve(w):
+        log = open(os.path.join(cwd, f"Worker_{w}.log"), "w")
+        proc = subprocess.Popen(
+            ["bash", "-c", command],
+            cwd=cwd,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            text=True,
+            bufsize=1,
+        )
+        try:
+            while True:
+                with lock:
+                    if not queue:
+                        break
+                    iter_val = queue.popleft()
+
+                try:
+                    proc.stdin.write(f"{iter_val}\n")
+                    proc.stdin.flush()
+                except BrokenPipeError:
+                    line = ""
+                else:
+                    # Wait for the end of the mode
+                    for line in iter(proc.stdout.readline, ""):
+                        log.write(line)
+                        if line.startswith("DONE"):
+                            break
+                    else:
+                        line = ""
+
+                if not line.startswith("DONE"):
+                    with lock:
+                        failed.append(iter_val)
+                    print(f"❌ Worker {w} died while integrating mode {iter_val} (log: Worker_{w}.log)")
+                    return
+
+                _, _, seconds, steps, sweeps = line.split()
+                result = {"iter": iter_val, "seconds": float(seconds), "steps": int(steps), "sweeps": int(sweeps), "worker": w}
+                with lock:
+                    done[iter_val] = result
+                print(f"✅ Mode {iter_val} done by worker {w} in {result['seconds']:.1f} s")
+                if on_complete is not None:
+                    on_complete(result)
+        finally:
+            try:
+                proc.stdin.close()
+            except BrokenPipeError:
+                pass
+            log.write(proc.stdout.read())
+            proc.wait()
+            log.close()
+
+    threads = [threading.Thread(target=serve, args=(w,)) for w in range(1, workers + 1)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    if failed or len(done) < len(iters):
+        missing = sorted(set(iters) - set(done))
+        raise RuntimeError(f"Modes not integrated: {missing} (see the Worker_*.log files in {cwd}).")
+
+    return done
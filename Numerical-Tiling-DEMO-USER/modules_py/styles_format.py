@@ -36,6 +36,26 @@ def configure_style():
     rc('text', usetex=True)
 
 
+def draft_style():
+    """
+    rc settings of the draft figures (used with `plt.rc_context`): mathtext
+    instead of LaTeX, much faster to draw and save
+    """
+    return {
+        'text.usetex': False,
+        'font.family': 'serif',
+        'font.serif': ['DejaVu Serif'],
+        'mathtext.fontset': 'cm',
+    }
+
+
+def mathtext_label(label):
+    """
+    LaTeX label drawn without LaTeX (mathtext has no \\displaystyle)
+    """
+    return label.replace("\\displaystyle", "")
+
+
 def sci_notation(num, decimal_digits=2):
     """
     Converts a number into a string in LaTeX-style scientific notation.
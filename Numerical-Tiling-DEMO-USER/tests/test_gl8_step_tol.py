@@ -0,0 +1,54 @@
+# tests/test_gl8_step_tol.py
+import os
+import shutil
+import numpy as np
+import pytest
+from modules_py.architecture import MODE_FOLDERS, create_split_file
+from modules_py.generate_fortran import build_parameter_sets, generate_fortran_files, load_template
+from modules_py.output_format import read_output
+from modules_py.run_fortran import run_simulation
+
+"""
+gl8 with a warm-started stage iteration (fortran_gl8_tol > 0) and the
+adaptive step (fortran_step_tol > 0) together: the trial steps whose stage
+iteration does not converge are rejected, so the spectrum stays finite and
+matches the default integrator. Needs gfortran.
+"""
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SMALL_RUN = {
+    "fortran_N_mod": 6, "fortran_N_step": 8.0, "fortran_kphys": 30.0,
+    "fortran_ellipse_resolution": 3, "fortran_time_resolution": 50,
+}
+
+
+def case_0_spectrum(mode, overrides):
+    """Power spectrum of case 0 (one part) generated and run with `overrides`."""
+    param_sets = build_parameter_sets(
+        mode,
+        case_overrides={"fortran_mod_pref": 0},
+        global_overrides={**SMALL_RUN, **overrides},
+        parallel_overrides=[{"fortran_part_iter_parallel": "Part_1", "fortran_iter_initial": 1, "fortran_iter_final": 6}],
+    )
+    template = "fortran_template_single.txt" if mode == "single" else "fortran_template_two_field.txt"
+    generate_fortran_files(load_template(template), mode, param_sets)
+    run_simulation(mode, param_sets, compiler="gfortran")
+
+    power_file = os.path.join(MODE_FOLDERS[mode], "Data_&_Codes_000", "Evolution_000", "Power_Spectrum_PS_000.dat")
+    return np.array(read_output(power_file)[0])
+
+
+@pytest.mark.skipif(shutil.which("gfortran") is None, reason="gfortran not installed")
+@pytest.mark.parametrize("mode", ["single", "two_field"])
+def test_gl8_tol_with_step_tol(mode, tmp_path, monkeypatch):
+    for folder in ("modules_py", "templates_fortran"):
+        shutil.copytree(os.path.join(ROOT, folder), tmp_path / folder)
+    monkeypatch.chdir(tmp_path)
+    create_split_file(mode)
+
+    reference = case_0_spectrum(mode, {})
+    spectrum = case_0_spectrum(mode, {"fortran_gl8_tol": 1e-12, "fortran_step_tol": 1e-11})
+
+    assert spectrum.shape == reference.shape
+    assert np.all(np.isfinite(spectrum))
+    np.testing.assert_allclose(spectrum, reference, rtol=1e-5)